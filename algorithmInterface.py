@@ -1,6 +1,7 @@
 from typing import TYPE_CHECKING
 from functools import reduce
 from collections import defaultdict
+import numpy as np
 
 from compositeTrack import CompositeTrack
 
@@ -51,56 +52,111 @@ class TrainSchedule:
         return self.__str__()
 
 
-nodeId = 0
-
-
-class Node:
-    tValue: int
-    cValue: int
-    canGoTo: list["Node"]
-    isPartOf: "City"
-    id: int
-
-    def __init__(self, tValue: int, scheduleLength: int, isPartOf: "City"):
-        global nodeId
+class TravellerGraph:
+    # node i is a departure (even i) or an arrival (odd i) of a train at a city
+    # one node is actualy many nodes with t-values equal to t0 + 0c ... t0 + xc where xc <= lastTrainTime
+    # the edges of node i are targets[offsets[i] : offsets[i + 1]]: a departure
+    # goes to its arrival, an arrival goes to every departure from the same city
+    tValue: np.ndarray
+    cValue: np.ndarray
+    city: np.ndarray
+    train: np.ndarray
+    offsets: np.ndarray
+    targets: np.ndarray
+    departures: dict[int, np.ndarray]
+
+    def __init__(
+        self,
+        tValue: np.ndarray,
+        cValue: np.ndarray,
+        city: np.ndarray,
+        train: np.ndarray,
+        offsets: np.ndarray,
+        targets: np.ndarray,
+        departures: dict[int, np.ndarray],
+    ):
         self.tValue = tValue
-        self.cValue = 2 * (scheduleLength + 10)
-        self.canGoTo = []
-        self.isPartOf = isPartOf
-        self.id = nodeId
-        nodeId += 1
+        self.cValue = cValue
+        self.city = city
+        self.train = train
+        self.offsets = offsets
+        self.targets = targets
+        self.departures = departures
+        self._lists = None
+
+    def as_lists(
+        self,
+    ) -> tuple[list[int], list[int], list[int], list[int], list[int], list[int]]:
+        # indexing python lists is a lot faster than indexing numpy arrays one
+        # element at a time, so the search works on list copies of the arrays
+        if self._lists is None:
+            self._lists = (
+                self.tValue.tolist(),
+                self.cValue.tolist(),
+                self.city.tolist(),
+                self.train.tolist(),
+                self.offsets.tolist(),
+                self.targets.tolist(),
+            )
+        return self._lists
+
+    def departures_from(self, city: int) -> list[int]:
+        if city not in self.departures:
+            return []
+        return self.departures[city].tolist()
 
-    def __eq__(self, value: "Node") -> bool:
-        return self.id == value.id
+    def __len__(self) -> int:
+        return len(self.tValue)
 
-    def __hash__(self) -> int:
-        return id(self)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_lists"] = None
+        return state
 
 
 class Schedule:
     trainSchedules: list[TrainSchedule]
 
-    def traveler_network(self) -> dict[int, tuple[list[Node], list[Node]]]:
-        nodes: dict[int, tuple[list[Node], list[Node]]] = defaultdict(lambda: ([], []))
-        for schedule in self.trainSchedules:
+    def traveler_network(self) -> TravellerGraph:
+        tValues: list[int] = []
+        cValues: list[int] = []
+        cities: list[int] = []
+        trains: list[int] = []
+        departures: dict[int, list[int]] = defaultdict(list)
+        for train, schedule in enumerate(self.trainSchedules):
+            cValue = 2 * (schedule.totalLength + 10)
             for start, outGoingTracks in schedule.cities.items():
                 for end, tracks in outGoingTracks.items():
                     for dep, arr in tracks:
-                        startNode = Node(dep, schedule.totalLength, start)
-                        endNode = Node(arr, schedule.totalLength, end)
-                        startNode.canGoTo.append(endNode)
-                        nodes[start.id][0].append(startNode)
-                        nodes[end.id][1].append(endNode)
-
-        for outgoingNodes, incommingNodes in nodes.values():
-            # one node is actualy many nodes with t-values equal to t0 + 0c ... t0 + xc where xc <= lastTrainTime
-            # each such node ni has connections to all nodes of opposite types nj
-            # such tj - cj <= ti < tj
-            # the cost is tj - ti
-            for node in incommingNodes:
-                node.canGoTo.extend(outgoingNodes)
-
-        return nodes
+                        departures[start.id].append(len(tValues))
+                        tValues.extend((dep, arr))
+                        cValues.extend((cValue, cValue))
+                        cities.extend((start.id, end.id))
+                        trains.extend((train, train))
+
+        # each arrival ni has connections to all departures nj of the same city
+        # such tj - cj <= ti < tj
+        # the cost is tj - ti
+        offsets = [0]
+        targets: list[int] = []
+        for node in range(0, len(tValues), 2):
+            targets.append(node + 1)
+            offsets.append(len(targets))
+            targets.extend(departures[cities[node + 1]])
+            offsets.append(len(targets))
+
+        return TravellerGraph(
+            np.array(tValues, dtype=np.int64),
+            np.array(cValues, dtype=np.int64),
+            np.array(cities, dtype=np.int64),
+            np.array(trains, dtype=np.int32),
+            np.array(offsets, dtype=np.int64),
+            np.array(targets, dtype=np.int32),
+            {
+                city: np.array(nodes, dtype=np.int32)
+                for city, nodes in departures.items()
+            },
+        )
 
     def __str__(self) -> str:
         return "Schedules: {}".format("\n".join([str(x) for x in self.trainSchedules]))
@@ -0,0 +1,197 @@
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from compositeTrack import CompositeTrack, floydWarshall, network_to_TSP
+from evaluationPool import EvaluationPool
+from evolutionary import init_pool, mutate, real_to_dummy, select
+from experiment import seed_everything
+from fitnessCache import FitnessCache
+from citiesToInt import cities_to_int
+from insertion import (
+    InsertionAlgorithm,
+    RouteSplitError,
+    perform_insertion_algorirthm,
+)
+from network import TrainNetwork
+
+# amounts of cities, every network gets 5 travellers per city like the experiments
+SIZES = [50, 100, 500, 2000]
+# the original pure python Floyd-Warshall is cubic, so it is only timed up to here
+REFERENCE_MAX_CITIES = 100
+
+
+def build_network(
+    amountCities: int, maxAttempts: int = 100
+) -> tuple[TrainNetwork, InsertionAlgorithm]:
+    for attempt in range(maxAttempts):
+        seed_everything("benchmark:{}:{}".format(amountCities, attempt))
+        try:
+            network = TrainNetwork(
+                amountCities, 2, 2, amountCities * 5, vectorized=True
+            )
+            schedule = InsertionAlgorithm(network, 15, 5)
+            return network, schedule
+        except RouteSplitError:
+            # the intercity route could not be split between the trains
+            continue
+    raise Exception("could not generate a connected network of {}".format(amountCities))
+
+
+def reference_distances(
+    network: TrainNetwork,
+) -> dict[tuple[int, int], "CompositeTrack | None"]:
+    dist: dict[tuple[int, int], CompositeTrack | None] = {
+        (i.id, j.id): None for i in network.cities for j in network.cities
+    }
+    for city in network.cities:
+        dist[city.id, city.id] = CompositeTrack([], 0, city, city)
+        for neighbour, track in city.neighbours.items():
+            dist[city.id, neighbour.id] = CompositeTrack(
+                [track], track.cost, city, neighbour
+            )
+    return dist
+
+
+def benchmark_cases(
+    network: TrainNetwork, schedule: InsertionAlgorithm
+) -> dict[str, Callable[[], Any]]:
+    # no case changes its inputs, so every case can be run more than once
+    tsp = network.get_shortest_paths()
+    cities = cities_to_int(network.cities)
+    processes = EvaluationPool(network, processes=0)
+    pool = real_to_dummy([schedule]) + init_pool(tsp, 19, 20)
+
+    def generation():
+        # a select and mutate step, evaluated in this process
+        survivors = select(pool[:], network, processes, FitnessCache())
+        mutate(survivors, tsp, cities, processes)
+
+    cases: dict[str, Callable[[], Any]] = {
+        "network_to_TSP": lambda: network_to_TSP(network.cities),
+        "traveler_network": schedule.traveler_network,
+        "get_average_travel_time": lambda: network.get_average_travel_time(schedule),
+        "perform_insertion_algorirthm": lambda: perform_insertion_algorirthm(
+            tsp, cities
+        ),
+        "evolutionary_generation": generation,
+    }
+    if len(network.cities) <= REFERENCE_MAX_CITIES:
+        cases["floydWarshall"] = lambda: floydWarshall(
+            reference_distances(network), network.cities
+        )
+    return cases
+
+
+def measure(case: Callable[[], Any], repeats: int) -> dict[str, float]:
+    # the time is the best of the repeats without tracemalloc, which slows down
+    # python code a lot, the peak memory comes from one extra traced run
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        case()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    case()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(times), "peakBytes": peak}
+
+
+def run_benchmarks(
+    sizes: list[int], repeats: int, only: list[str] | None = None
+) -> dict[str, Any]:
+    results: dict[str, dict[str, float]] = dict()
+    for size in sizes:
+        network, schedule = build_network(size)
+        for name, case in benchmark_cases(network, schedule).items():
+            if only is not None and name not in only:
+                continue
+            # the random state is the same for every run of a case
+            random.seed("benchmark:{}:{}".format(size, name))
+            key = "{}/{}".format(name, size)
+            results[key] = measure(case, repeats)
+            print(
+                "{:<40}{:>10.4f}s {:>12} bytes".format(
+                    key, results[key]["seconds"], results[key]["peakBytes"]
+                ),
+                flush=True,
+            )
+    return {
+        "python": sys.version,
+        "platform": platform.platform(),
+        "repeats": repeats,
+        "results": results,
+    }
+
+
+def compare(
+    baseline: dict[str, Any], current: dict[str, Any], threshold: float
+) -> list[str]:
+    # a case regresses when its time or peak memory grew by more than threshold
+    regressions: list[str] = []
+    for case, new in sorted(current["results"].items()):
+        old = baseline["results"].get(case)
+        if old is None:
+            print("{:<40} new case".format(case))
+            continue
+        timeRatio = new["seconds"] / max(old["seconds"], 1e-9)
+        memoryRatio = new["peakBytes"] / max(old["peakBytes"], 1)
+        flags = []
+        if timeRatio > 1 + threshold:
+            flags.append("time")
+        if memoryRatio > 1 + threshold:
+            flags.append("memory")
+        print(
+            "{:<40}{:>8.2f}x time {:>8.2f}x memory {}".format(
+                case, timeRatio, memoryRatio, " ".join(flags)
+            )
+        )
+        if len(flags) > 0:
+            regressions.append(case)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time the hot paths of the project")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    runParser = subparsers.add_parser("run", help="write a JSON baseline")
+    runParser.add_argument("output")
+    compareParser = subparsers.add_parser(
+        "compare", help="run again and flag regressions against a baseline"
+    )
+    compareParser.add_argument("baseline")
+    compareParser.add_argument(
+        "--current", help="compare this result file instead of running again"
+    )
+    compareParser.add_argument("--threshold", type=float, default=0.1)
+    for subparser in (runParser, compareParser):
+        subparser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+        subparser.add_argument("--repeats", type=int, default=3)
+        subparser.add_argument("--cases", nargs="+", default=None)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        result = run_benchmarks(args.sizes, args.repeats, args.cases)
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=2)
+    else:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+        if args.current is not None:
+            with open(args.current, "r") as file:
+                current = json.load(file)
+        else:
+            current = run_benchmarks(args.sizes, args.repeats, args.cases)
+        regressions = compare(baseline, current, args.threshold)
+        if len(regressions) > 0:
+            print("{} regressions".format(len(regressions)))
+            sys.exit(1)
@@ -1,4 +1,7 @@
+import heapq
+from collections.abc import Iterator, Mapping
 from typing import TYPE_CHECKING, cast
+import numpy as np
 
 if TYPE_CHECKING:
     from network import City, Track
@@ -62,28 +65,242 @@ def floydWarshall(
     return dist
 
 
+class LazyCompositeTrack(CompositeTrack):
+    # the tracks are only rebuilt from the predecessor matrix when someone reads them
+    paths: "ShortestPaths"
+
+    def __init__(
+        self,
+        paths: "ShortestPaths",
+        totalDistance: int,
+        start: "City",
+        end: "City",
+    ):
+        self.paths = paths
+        self.totalDistance = totalDistance
+        self.start = start
+        self.end = end
+        self._tracks: list["Track"] | None = None
+
+    @property
+    def tracks(self) -> list["Track"]:
+        if self._tracks is None:
+            self._tracks = self.paths.path_tracks(self.start.id, self.end.id)
+        return self._tracks
+
+    def __reduce__(self):
+        # send a plain CompositeTrack instead of the whole distance matrix
+        return (
+            CompositeTrack,
+            (self.tracks, self.totalDistance, self.start, self.end),
+        )
+
+
+UNREACHABLE = np.iinfo(np.int64).max // 4
+
+
+class ShortestPaths(Mapping[tuple[int, int], "CompositeTrack | None"]):
+    cities: list["City"]
+    index: dict[int, int]
+    dist: np.ndarray
+    pred: np.ndarray
+    entries: dict[tuple[int, int], "CompositeTrack | None"]
+
+    def __init__(self, cities: list["City"], dist: np.ndarray, pred: np.ndarray):
+        self.cities = cities
+        self.index = {city.id: i for i, city in enumerate(cities)}
+        self.dist = dist
+        self.pred = pred
+        self.entries = dict()
+
+    def __getitem__(self, key: tuple[int, int]) -> "CompositeTrack | None":
+        if key in self.entries:
+            return self.entries[key]
+        i = self.index[key[0]]
+        j = self.index[key[1]]
+        distance = int(self.dist[i, j])
+        entry = None
+        if distance < UNREACHABLE:
+            entry = LazyCompositeTrack(self, distance, self.cities[i], self.cities[j])
+        self.entries[key] = entry
+        return entry
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return ((start.id, end.id) for start in self.cities for end in self.cities)
+
+    def __len__(self) -> int:
+        return len(self.cities) * len(self.cities)
+
+    def __contains__(self, key: object) -> bool:
+        return (
+            isinstance(key, tuple)
+            and len(key) == 2
+            and key[0] in self.index
+            and key[1] in self.index
+        )
+
+    def path_tracks(self, start: int, end: int) -> list["Track"]:
+        i = self.index[start]
+        current = self.index[end]
+        tracks: list["Track"] = []
+        while current != i:
+            previous = int(self.pred[i, current])
+            tracks.append(self.cities[previous].neighbours[self.cities[current]])
+            current = previous
+        tracks.reverse()
+        return tracks
+
+    def distance_matrix(self, ids: list[int]) -> np.ndarray:
+        indices = np.array([self.index[cityId] for cityId in ids], dtype=np.int64)
+        return self.dist[np.ix_(indices, indices)]
+
+    def is_connected(self) -> bool:
+        return bool((self.dist < UNREACHABLE).all())
+
+    def set_track_cost(self, track: "Track", cost: int):
+        # only the pairs whose shortest path can change are updated
+        oldCost = track.cost
+        track.cost = cost
+        i, j = self.track_indices(track)
+        if cost < oldCost:
+            self.decrease(i, j, cost)
+        elif cost > oldCost:
+            self.increase(i, j, oldCost)
+
+    def remove_track(self, track: "Track"):
+        city1, city2 = track.connects
+        i, j = self.track_indices(track)
+        city1.neighbours.pop(city2)
+        city2.neighbours.pop(city1)
+        self.increase(i, j, track.cost)
+
+    def add_track(self, track: "Track"):
+        city1, city2 = track.connects
+        city1.neighbours[city2] = track
+        city2.neighbours[city1] = track
+        i, j = self.track_indices(track)
+        self.decrease(i, j, track.cost)
+
+    def track_indices(self, track: "Track") -> tuple[int, int]:
+        return self.index[track.connects[0].id], self.index[track.connects[1].id]
+
+    def decrease(self, i: int, j: int, cost: int):
+        # a cheaper track i-j can only help paths that use it once, in one of the
+        # two directions, so every pair is checked against both at once
+        for u, v in ((i, j), (j, i)):
+            throughTrack = self.dist[:, u, None] + cost + self.dist[None, v, :]
+            better = throughTrack < self.dist
+            if not better.any():
+                continue
+            self.invalidate(better)
+            # the path to b goes a .. u, v .. b, so b is reached like from v
+            predThrough = self.pred[v].copy()
+            predThrough[v] = u
+            self.dist[better] = throughTrack[better]
+            self.pred[better] = np.broadcast_to(predThrough, better.shape)[better]
+
+    def increase(self, i: int, j: int, oldCost: int):
+        # the pairs whose shortest path may have used the old track i-j lose it,
+        # every city with such a pair gets a new row from Dijkstra
+        usedTrack = (
+            self.dist[:, i, None] + oldCost + self.dist[None, j, :] == self.dist
+        ) | (self.dist[:, j, None] + oldCost + self.dist[None, i, :] == self.dist)
+        rows = np.flatnonzero(usedTrack.any(axis=1))
+        changed = np.zeros(self.dist.shape, dtype=bool)
+        changed[rows] = True
+        changed[:, rows] = True
+        self.invalidate(changed)
+        adjacency = [
+            [
+                (self.index[neighbour.id], track.cost)
+                for neighbour, track in city.neighbours.items()
+            ]
+            for city in self.cities
+        ]
+        for row in rows.tolist():
+            self.dist[row], self.pred[row] = self.dijkstra(adjacency, row)
+
+    def dijkstra(
+        self, adjacency: list[list[tuple[int, int]]], source: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        distances = [UNREACHABLE] * len(adjacency)
+        predecessors = [-1] * len(adjacency)
+        distances[source] = 0
+        predecessors[source] = source
+        queue = [(0, source)]
+        while len(queue) > 0:
+            distance, current = heapq.heappop(queue)
+            if distance > distances[current]:
+                continue
+            for other, cost in adjacency[current]:
+                newDistance = distance + cost
+                if newDistance < distances[other]:
+                    distances[other] = newDistance
+                    predecessors[other] = current
+                    heapq.heappush(queue, (newDistance, other))
+        return np.array(distances, dtype=self.dist.dtype), np.array(
+            predecessors, dtype=self.pred.dtype
+        )
+
+    def invalidate(self, changed: np.ndarray):
+        # must be called before the matrices change: composite tracks that were
+        # handed out keep the path they had, the next lookup of a changed pair
+        # gives a new one
+        for key, entry in list(self.entries.items()):
+            if changed[self.index[key[0]], self.index[key[1]]]:
+                if isinstance(entry, LazyCompositeTrack) and entry._tracks is None:
+                    entry._tracks = self.path_tracks(key[0], key[1])
+                del self.entries[key]
+
+    def __getstate__(self):
+        # the composite tracks are cheap to recreate, so they are not pickled
+        state = self.__dict__.copy()
+        state["entries"] = dict()
+        return state
+
+
+def floyd_warshall_matrix(
+    dist: np.ndarray, pred: np.ndarray, blockSize: int = 512
+) -> tuple[np.ndarray, np.ndarray]:
+    # same relaxation order as floydWarshall, but every k relaxes a block of
+    # rows at once. row k never changes while relaxing over k, so a copy of it
+    # can be used for all blocks
+    amount = len(dist)
+    for k in range(amount):
+        rowK = dist[k].copy()
+        predK = pred[k].copy()
+        for blockStart in range(0, amount, blockSize):
+            block = slice(blockStart, blockStart + blockSize)
+            throughK = dist[block, k, None] + rowK[None, :]
+            better = throughK < dist[block]
+            if not better.any():
+                continue
+            dist[block][better] = throughK[better]
+            pred[block][better] = np.broadcast_to(predK, better.shape)[better]
+    return dist, pred
+
+
+def network_to_shortest_paths(cities: list["City"]) -> ShortestPaths:
+    amount = len(cities)
+    index = {city.id: i for i, city in enumerate(cities)}
+    dist = np.full((amount, amount), UNREACHABLE, dtype=np.int64)
+    pred = np.full((amount, amount), -1, dtype=np.int32)
+    for i, city in enumerate(cities):
+        for neighbour, track in city.neighbours.items():
+            j = index[neighbour.id]
+            dist[i, j] = track.cost
+            pred[i, j] = i
+        dist[i, i] = 0
+        pred[i, i] = i
+    floyd_warshall_matrix(dist, pred)
+    return ShortestPaths(cities, dist, pred)
+
+
 def network_to_TSP(
     cities: list["City"],
 ) -> dict[tuple[int, int], "CompositeTrack"]:
-    result: dict[tuple[int, int], "CompositeTrack | None"] = dict()
-
-    def list_neighbours_fill(city: "City"):
-        for other_city in cities:
-            if other_city.id == city.id:
-                result[city.id, city.id] = CompositeTrack([], 0, city, city)
-            elif other_city in city.neighbours:
-                track = city.neighbours[other_city]
-                result[city.id, other_city.id] = CompositeTrack(
-                    [track], track.cost, city, other_city
-                )
-            else:
-                result[city.id, other_city.id] = None
-
-    [list_neighbours_fill(city) for city in cities]
-    tsp = floydWarshall(result, cities)
-    noNone = len([0 for v in result.values() if v is None]) == 0
-    if not noNone:
+    tsp = network_to_shortest_paths(cities)
+    if not tsp.is_connected():
         raise Exception("accidentally made 2 or more seperate networks")
-    else:
-        tsp = cast(dict[tuple[int, int], "CompositeTrack"], tsp)
-    return tsp
+    # ShortestPaths behaves like the dict the old implementation returned
+    return cast(dict[tuple[int, int], "CompositeTrack"], tsp)
@@ -0,0 +1,156 @@
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+import numpy as np
+
+from fitnessCache import ScheduleKey, schedule_key
+from genome import Genome, genome_schedule, to_genome
+
+if TYPE_CHECKING:
+    from compositeTrack import CompositeTrack
+    from evaluationPool import EvaluationPool
+    from network import Journey, TrainNetwork
+
+# (total travel time of all travellers, journey of every origin-destination pair)
+EvaluationResult = tuple[int, list["Journey"]]
+
+
+def changed_trains(parent: Genome, child: Genome) -> list[int] | None:
+    if len(parent) != len(child):
+        return None
+    return [
+        j
+        for j, (parentStops, childStops) in enumerate(zip(parent, child))
+        if not np.array_equal(parentStops, childStops)
+    ]
+
+
+def affected_pairs(
+    network: "TrainNetwork",
+    parentJourneys: list["Journey"],
+    child: Genome,
+    changed: list[int],
+) -> list[int]:
+    # only travellers whose best journey used one of the changed trains, or whose
+    # start or destination a changed train now stops at, are searched again.
+    # anyone else keeps the journey they had with the parent, so the result is an
+    # estimate that can be off both ways: a changed train can give them a faster
+    # transfer halfway, and where a journey counts from depends on the rest of the
+    # search tree
+    changedTrains = set(changed)
+    servedCities = {city for j in changed for city in child[j].tolist()}
+    return [
+        pair
+        for pair, (origin, destination, (_, trains, _)) in enumerate(
+            zip(
+                network.demand.origins.tolist(),
+                network.demand.destinations.tolist(),
+                parentJourneys,
+            )
+        )
+        if not trains.isdisjoint(changedTrains)
+        or origin in servedCities
+        or destination in servedCities
+    ]
+
+
+def evaluate_journeys(
+    network: "TrainNetwork",
+    schedule: Genome,
+    parent: Genome | None,
+    parentResult: EvaluationResult | None,
+) -> tuple[EvaluationResult, int]:
+    realSchedule = genome_schedule(network, schedule)
+    counts = network.demand.counts.tolist()
+    changed = None if parent is None else changed_trains(parent, schedule)
+    if changed is None or parentResult is None:
+        journeys = network.get_journeys(realSchedule)
+        total = sum(
+            [travelTime * count for (travelTime, _, _), count in zip(journeys, counts)]
+        )
+        return (total, journeys), len(journeys)
+
+    parentTotal, parentJourneys = parentResult
+    affected = affected_pairs(network, parentJourneys, schedule, changed)
+    journeys = parentJourneys[:]
+    total = parentTotal
+    if len(affected) > 0:
+        newJourneys = network.get_journeys(realSchedule, pairs=affected)
+        for pair, journey in zip(affected, newJourneys):
+            total += (journey[0] - journeys[pair][0]) * counts[pair]
+            journeys[pair] = journey
+    return (total, journeys), len(affected)
+
+
+class DeltaEvaluator:
+    network: "TrainNetwork"
+    maxSize: int
+    results: OrderedDict[ScheduleKey, EvaluationResult]
+    fullEvaluations: int
+    deltaEvaluations: int
+    pairsEvaluated: int
+    pairsSkipped: int
+
+    def __init__(self, network: "TrainNetwork", maxSize: int = 4096):
+        self.network = network
+        self.maxSize = maxSize
+        self.results = OrderedDict()
+        self.fullEvaluations = 0
+        self.deltaEvaluations = 0
+        self.pairsEvaluated = 0
+        self.pairsSkipped = 0
+
+    def evaluate(
+        self,
+        schedules: list[list[list["CompositeTrack"]]],
+        parents: list[list[list["CompositeTrack"]] | None],
+        processes: "EvaluationPool",
+    ) -> list[float]:
+        tasks = []
+        for schedule, parent in zip(schedules, parents):
+            parentResult = None
+            if parent is not None and schedule_key(parent) in self.results:
+                parentResult = self.results[schedule_key(parent)]
+                self.results.move_to_end(schedule_key(parent))
+            # only the city ids of the routes go to the workers
+            if parentResult is None:
+                tasks.append((to_genome(schedule), None, None))
+            else:
+                tasks.append((to_genome(schedule), to_genome(parent), parentResult))
+        outcomes = processes.starmap_network(evaluate_journeys, tasks)
+
+        fitnesses: list[float] = []
+        amountPairs = len(self.network.demand)
+        amountTravellers = self.network.demand.total()
+        for schedule, (_, _, parentResult), (result, evaluated) in zip(
+            schedules, tasks, outcomes
+        ):
+            # estimates are not kept as parents, so their error can not build up
+            # over the generations
+            if parentResult is None:
+                self.fullEvaluations += 1
+                self.store(schedule_key(schedule), result)
+            else:
+                self.deltaEvaluations += 1
+            self.pairsEvaluated += evaluated
+            self.pairsSkipped += amountPairs - evaluated
+            fitnesses.append(result[0] / amountTravellers)
+        return fitnesses
+
+    def store(self, key: ScheduleKey, result: EvaluationResult):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.maxSize:
+            self.results.popitem(last=False)
+
+    def __str__(self) -> str:
+        return (
+            "DeltaEvaluator {} full, {} delta, {} pairs evaluated, {} skipped".format(
+                self.fullEvaluations,
+                self.deltaEvaluations,
+                self.pairsEvaluated,
+                self.pairsSkipped,
+            )
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
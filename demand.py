@@ -0,0 +1,96 @@
+from typing import TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    from traveller import Traveller
+
+
+class DemandMatrix:
+    # sparse origin-destination matrix: counts[i] travellers go from city
+    # origins[i] to city destinations[i], every pair appears once
+    origins: np.ndarray
+    destinations: np.ndarray
+    counts: np.ndarray
+
+    def __init__(
+        self, origins: np.ndarray, destinations: np.ndarray, counts: np.ndarray
+    ):
+        self.origins = origins
+        self.destinations = destinations
+        self.counts = counts
+
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def pairs(self) -> list[tuple[int, int]]:
+        return list(zip(self.origins.tolist(), self.destinations.tolist()))
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __str__(self) -> str:
+        return "DemandMatrix with {} travellers over {} pairs".format(
+            self.total(), len(self)
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def aggregate(
+    origins: np.ndarray, destinations: np.ndarray, cityIds: np.ndarray
+) -> DemandMatrix:
+    # origins and destinations are indices into cityIds, one entry per traveller
+    amountCities = len(cityIds)
+    pairs, counts = np.unique(
+        origins.astype(np.int64) * amountCities + destinations, return_counts=True
+    )
+    return DemandMatrix(
+        cityIds[pairs // amountCities], cityIds[pairs % amountCities], counts
+    )
+
+
+def generate_demand(
+    popularity: np.ndarray,
+    cityIds: np.ndarray,
+    amountTravellers: int,
+    rng: np.random.Generator,
+    originSkewness: float = 1.5,
+    destinationSkewness: float = 3.5,
+) -> DemandMatrix:
+    # TrainNetwork.__init_travellers accepts a random origin o with chance
+    # p(o) ** 1.5 and then a random other destination d with chance p(d) ** 3.5,
+    # starting over when either is rejected. so a traveller goes from o to d with
+    # probability proportional to p(o) ** 1.5 * p(d) ** 3.5 for every d != o,
+    # which is sampled here directly: first o from its marginal, then d given o
+    originWeight = popularity**originSkewness
+    destinationWeight = popularity**destinationSkewness
+    marginal = originWeight * (destinationWeight.sum() - destinationWeight)
+    origins = rng.choice(len(popularity), amountTravellers, p=marginal / marginal.sum())
+    destinationChance = destinationWeight / destinationWeight.sum()
+    destinations = rng.choice(len(popularity), amountTravellers, p=destinationChance)
+    same = destinations == origins
+    while same.any():
+        destinations[same] = rng.choice(
+            len(popularity), int(same.sum()), p=destinationChance
+        )
+        same = destinations == origins
+    return aggregate(origins, destinations, cityIds)
+
+
+def demand_from_travellers(travellers: list["Traveller"]) -> DemandMatrix:
+    cityIds = np.array(
+        sorted(
+            {traveller.start.id for traveller in travellers}
+            | {traveller.destination.id for traveller in travellers}
+        ),
+        dtype=np.int64,
+    )
+    index = {cityId: i for i, cityId in enumerate(cityIds.tolist())}
+    origins = np.array(
+        [index[traveller.start.id] for traveller in travellers], dtype=np.int64
+    )
+    destinations = np.array(
+        [index[traveller.destination.id] for traveller in travellers], dtype=np.int64
+    )
+    return aggregate(origins, destinations, cityIds)
@@ -0,0 +1,132 @@
+import math
+import multiprocessing
+from multiprocessing.pool import Pool
+from typing import TYPE_CHECKING, Any, Callable, Iterable
+
+import instrumentation
+
+if TYPE_CHECKING:
+    from network import TrainNetwork
+
+# the network of the current worker process, set once by the pool initializer
+workerNetwork: "TrainNetwork | None" = None
+
+
+def init_worker(network: "TrainNetwork"):
+    global workerNetwork
+    workerNetwork = network
+
+
+def call_with_network(
+    function: Callable[..., Any], args: tuple, counting: bool
+) -> tuple[Any, "instrumentation.Stats | None"]:
+    # runs in a worker. every task is counted in a fresh stats that goes back with
+    # the result, a worker does not count anything while the caller does not
+    assert workerNetwork is not None
+    instrumentation.stats = instrumentation.Stats() if counting else None
+    return function(workerNetwork, *args), instrumentation.stats
+
+
+def collect_stats(outcome: tuple[Any, "instrumentation.Stats | None"]) -> Any:
+    result, taskStats = outcome
+    if taskStats is not None and instrumentation.stats is not None:
+        instrumentation.stats.merge(taskStats)
+    return result
+
+
+class EvaluationPool:
+    # a process pool whose workers receive the network once, instead of with
+    # every task. it is started lazily, restarted when the network changes and
+    # can be reused across generations and algorithm instances
+    # processes=0 evaluates everything in the current process
+    network: "TrainNetwork | None"
+    processes: int
+    pool: Pool | None
+
+    def __init__(
+        self, network: "TrainNetwork | None" = None, processes: int | None = None
+    ):
+        self.network = network
+        self.processes = multiprocessing.cpu_count() if processes is None else processes
+        self.pool = None
+
+    def set_network(self, network: "TrainNetwork"):
+        if network is self.network:
+            return
+        self.close()
+        self.network = network
+
+    def chunksize(self, amountTasks: int) -> int:
+        # about four chunks per worker keeps the workers busy without sending
+        # every task on its own
+        return max(1, math.ceil(amountTasks / (self.processes * 4)))
+
+    def get_pool(self) -> Pool:
+        if self.network is None:
+            raise Exception("the evaluation pool has no network")
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(
+                self.processes, initializer=init_worker, initargs=(self.network,)
+            )
+        return self.pool
+
+    def starmap_network(
+        self, function: Callable[..., Any], tasks: list[tuple]
+    ) -> list[Any]:
+        # calls function(network, *task) for every task
+        if self.processes == 0:
+            return [function(self.get_network(), *task) for task in tasks]
+        counting = instrumentation.stats is not None
+        outcomes = self.get_pool().starmap(
+            call_with_network,
+            [(function, task, counting) for task in tasks],
+            self.chunksize(len(tasks)),
+        )
+        return [collect_stats(outcome) for outcome in outcomes]
+
+    def submit_network(
+        self,
+        function: Callable[..., Any],
+        args: tuple,
+        callback: Callable[[Any], None],
+        errorCallback: Callable[[BaseException], None],
+    ):
+        # calls function(network, *args) without waiting for it, callback gets the
+        # result in a thread of the current process
+        if self.processes == 0:
+            try:
+                result = function(self.get_network(), *args)
+            except Exception as error:
+                errorCallback(error)
+                return
+            callback(result)
+            return
+        self.get_pool().apply_async(
+            call_with_network,
+            (function, args, instrumentation.stats is not None),
+            callback=lambda outcome: callback(collect_stats(outcome)),
+            error_callback=errorCallback,
+        )
+
+    def map(self, function: Callable[[Any], Any], items: Iterable[Any]) -> list[Any]:
+        items = list(items)
+        if self.processes == 0:
+            return [function(item) for item in items]
+        return self.get_pool().map(function, items, self.chunksize(len(items)))
+
+    def get_network(self) -> "TrainNetwork":
+        if self.network is None:
+            raise Exception("the evaluation pool has no network")
+        return self.network
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self) -> "EvaluationPool":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
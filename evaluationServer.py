@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import json
+import os
+from typing import TYPE_CHECKING, Any, cast
+
+from algorithmInterface import NoAlgorithmSchedule, TrainSchedule
+from evaluationPool import EvaluationPool
+
+if TYPE_CHECKING:
+    from network import TrainNetwork
+
+# a route is the list of city ids a train visits, a schedule is a list of routes
+Routes = list[list[int]]
+
+
+def routes_to_schedule(network: "TrainNetwork", routes: Routes) -> NoAlgorithmSchedule:
+    tsp = network.get_shortest_paths()
+    trainSchedules = []
+    for route in routes:
+        if len(route) < 2:
+            raise Exception("a route needs at least two cities")
+        tracks = [tsp[start, end] for start, end in zip(route, route[1:])]
+        trainSchedules.append(TrainSchedule(False, tracks))
+    return NoAlgorithmSchedule(trainSchedules)
+
+
+def evaluate_routes(network: "TrainNetwork", routes: Routes) -> float | str:
+    # runs in a worker, a bad schedule only fails its own request
+    try:
+        return network.get_average_travel_time(routes_to_schedule(network, routes))
+    except Exception as error:
+        return "{}: {}".format(type(error).__name__, error)
+
+
+class EvaluationServer:
+    # keeps one network and one warm evaluation pool for many clients. requests
+    # are json lines {"id": ..., "schedule": [[city id, ...], ...]} and every
+    # answer is {"id": ..., "fitness": ...} or {"id": ..., "error": ...}.
+    # requests that arrive together are sent to the pool as a single batch
+    network: "TrainNetwork"
+    processes: EvaluationPool
+    socketPath: str
+    batchDelay: float
+    maxBatch: int
+    requests: "asyncio.Queue[tuple[Routes, asyncio.Future]]"
+    batches: int
+    evaluated: int
+
+    def __init__(
+        self,
+        network: "TrainNetwork",
+        socketPath: str,
+        processes: EvaluationPool | None = None,
+        batchDelay: float = 0.005,
+        maxBatch: int = 256,
+    ):
+        self.network = network
+        self.socketPath = socketPath
+        self.processes = EvaluationPool(network) if processes is None else processes
+        self.processes.set_network(network)
+        self.batchDelay = batchDelay
+        self.maxBatch = maxBatch
+        self.batches = 0
+        self.evaluated = 0
+        # computed before the workers are forked, so they start with it
+        network.get_shortest_paths()
+
+    async def serve(self, ready: asyncio.Event | None = None):
+        self.requests = asyncio.Queue()
+        if os.path.exists(self.socketPath):
+            os.remove(self.socketPath)
+        server = await asyncio.start_unix_server(self.handle_client, self.socketPath)
+        batcher = asyncio.create_task(self.run_batches())
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self.processes.close()
+            if os.path.exists(self.socketPath):
+                os.remove(self.socketPath)
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        # every line is answered on its own, so a client can send many at once
+        pending: set[asyncio.Task] = set()
+        while True:
+            line = await reader.readline()
+            if len(line) == 0:
+                break
+            task = asyncio.create_task(self.answer(line, writer))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if len(pending) > 0:
+            await asyncio.wait(pending)
+        writer.close()
+
+    async def answer(self, line: bytes, writer: asyncio.StreamWriter):
+        requestId = None
+        try:
+            request = json.loads(line)
+            requestId = request.get("id")
+            future = asyncio.get_running_loop().create_future()
+            await self.requests.put((request["schedule"], future))
+            result = await future
+            if isinstance(result, str):
+                response: dict[str, Any] = {"id": requestId, "error": result}
+            else:
+                response = {"id": requestId, "fitness": result}
+        except Exception as error:
+            response = {
+                "id": requestId,
+                "error": "{}: {}".format(type(error).__name__, error),
+            }
+        writer.write((json.dumps(response) + "\n").encode())
+        await writer.drain()
+
+    async def run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.requests.get()]
+            # give the requests that are on their way a moment to join the batch
+            await asyncio.sleep(self.batchDelay)
+            while len(batch) < self.maxBatch and not self.requests.empty():
+                batch.append(self.requests.get_nowait())
+            try:
+                results = await loop.run_in_executor(
+                    None,
+                    self.processes.starmap_network,
+                    evaluate_routes,
+                    [(routes,) for routes, _ in batch],
+                )
+            except Exception as error:
+                results = ["{}: {}".format(type(error).__name__, error)] * len(batch)
+            self.batches += 1
+            self.evaluated += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def __str__(self) -> str:
+        return "EvaluationServer on {}, {} schedules in {} batches".format(
+            self.socketPath, self.evaluated, self.batches
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+async def request_fitnesses(socketPath: str, schedules: list[Routes]) -> list[float]:
+    # sends all schedules at once and matches the answers by id
+    reader, writer = await asyncio.open_unix_connection(socketPath)
+    for i, routes in enumerate(schedules):
+        writer.write((json.dumps({"id": i, "schedule": routes}) + "\n").encode())
+    await writer.drain()
+    fitnesses: list[float | None] = [None] * len(schedules)
+    for _ in schedules:
+        response = json.loads(await reader.readline())
+        if "error" in response:
+            writer.close()
+            raise Exception(
+                "schedule {} failed: {}".format(response["id"], response["error"])
+            )
+        fitnesses[response["id"]] = response["fitness"]
+    writer.close()
+    await writer.wait_closed()
+    return cast(list[float], fitnesses)
+
+
+def evaluate_remote(socketPath: str, schedules: list[Routes]) -> list[float]:
+    return asyncio.run(request_fitnesses(socketPath, schedules))
+
+
+if __name__ == "__main__":
+    from network import TrainNetwork
+
+    parser = argparse.ArgumentParser(
+        description="score schedules against one network over a unix socket"
+    )
+    parser.add_argument("network", help="a network written by TrainNetwork.save")
+    parser.add_argument("socket")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    server = EvaluationServer(
+        TrainNetwork.load(args.network),
+        args.socket,
+        EvaluationPool(processes=args.processes),
+    )
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
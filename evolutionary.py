@@ -1,15 +1,36 @@
-import copy
 import math
-from multiprocessing.pool import Pool
 import random
-import multiprocessing
 import functools
+import queue
+import time
+import numpy as np
 from tqdm import tqdm
 from algorithmInterface import Schedule, NoAlgorithmSchedule, TrainSchedule
 from typing import TYPE_CHECKING
 from citiesToInt import cities_to_int
 
-from compositeTrack import network_to_TSP
+from fitnessCache import FitnessCache, ScheduleKey, schedule_key
+from deltaEvaluation import DeltaEvaluator
+from evaluationPool import EvaluationPool
+import instrumentation
+from racing import RacingStats, race
+from genome import Genome, evaluate_genome, from_genome, mutate_genome, to_genome
+from stopping import (
+    Checkpoint,
+    StoppingCriteria,
+    key_to_schedule,
+    load_checkpoint,
+    remove_checkpoint,
+    save_checkpoint,
+)
+from fidelity import (
+    FidelitySchedule,
+    TravellerSample,
+    evaluate_pool_sampled,
+    pair_strata,
+    spearman,
+    stratified_sample,
+)
 
 if TYPE_CHECKING:
     from network import TrainNetwork, City
@@ -45,16 +66,76 @@ def init_pool(
     return schedules
 
 
+def seed_pool(
+    tsp: dict[tuple[int, int], "CompositeTrack"], initSchedule: Schedule, size: int
+) -> list[DummySchedule]:
+    # mutations never change a schedule in place, so the copies can share the
+    # composite tracks of the tsp instead of deep copies of the network
+    genome = to_genome(real_to_dummy([initSchedule])[0])
+    return [from_genome(tsp, genome) for _ in range(size)]
+
+
+def evaluate_pool(
+    pool: list[DummySchedule],
+    network: "TrainNetwork",
+    processes: EvaluationPool,
+    cache: FitnessCache,
+    delta: DeltaEvaluator | None = None,
+    parents: list[DummySchedule | None] | None = None,
+) -> list[float]:
+    processes.set_network(network)
+    keys = [schedule_key(schedule) for schedule in pool]
+    uniqueSchedules = dict(zip(keys, pool))
+    if parents is None:
+        parents = [None] * len(pool)
+    uniqueParents = dict(zip(keys, parents))
+    # duplicates within the pool are only evaluated once
+    cache.hits += len(keys) - len(uniqueSchedules)
+    fitnesses: dict[ScheduleKey, float] = dict()
+    toEvaluate: list[ScheduleKey] = []
+    for key in uniqueSchedules:
+        fitness = cache.get(key)
+        if fitness is None:
+            toEvaluate.append(key)
+        else:
+            fitnesses[key] = fitness
+    if delta is None:
+        newFitnesses = processes.starmap_network(
+            evaluate_genome,
+            [(to_genome(uniqueSchedules[key]),) for key in toEvaluate],
+        )
+    else:
+        newFitnesses = delta.evaluate(
+            [uniqueSchedules[key] for key in toEvaluate],
+            [uniqueParents[key] for key in toEvaluate],
+            processes,
+        )
+    instrumentation.count("evaluations", len(toEvaluate))
+    for key, fitness in zip(toEvaluate, newFitnesses):
+        fitnesses[key] = fitness
+        cache.put(key, fitness)
+    return [fitnesses[key] for key in keys]
+
+
 def select(
     pool: list[DummySchedule],
     network: "TrainNetwork",
-    processes: Pool,
+    processes: EvaluationPool,
+    cache: FitnessCache,
+    delta: DeltaEvaluator | None = None,
+    parents: list[DummySchedule | None] | None = None,
 ) -> list[DummySchedule]:
-    realSchedules = dummy_to_real(pool)
-    mappedSchedules = list(
-        enumerate(processes.map(network.get_average_travel_time, realSchedules))
+    return select_by_fitness(
+        pool, evaluate_pool(pool, network, processes, cache, delta, parents)
     )
-    sortedSchedules = sorted(mappedSchedules, key=lambda x: x[1])
+
+
+def select_by_fitness(
+    pool: list[DummySchedule], fitnesses: list[float]
+) -> list[DummySchedule]:
+    if instrumentation.stats is not None:
+        instrumentation.stats.record_fitnesses(fitnesses)
+    sortedSchedules = sorted(enumerate(fitnesses), key=lambda x: x[1])
     bestPart = sortedSchedules[: math.ceil(len(pool) / 4)]
     randomPart = random.sample(
         sortedSchedules[math.ceil(len(pool) / 4) :],
@@ -63,77 +144,241 @@ def select(
     return [pool[i] for i, _ in bestPart] + [pool[i] for i, _ in randomPart]
 
 
-def mutateSchedule(
-    tsp: dict[tuple[int, int], "CompositeTrack"],
-    cities: list[int],
-    schedule: DummySchedule,
-) -> DummySchedule:
-    child = schedule[:]
-    itemsToMutate = random.sample(list(enumerate(child)), math.ceil(len(child) / 2))
-    for j, item in itemsToMutate:
-        chance = random.random()
-        if len(item) == 1 or chance <= 0.5:
-            child[j] = mutateInsert(item, tsp, cities)
-        else:
-            child[j] = mutateDelete(item, tsp)
-    return child
+def select_sampled(
+    pool: list[DummySchedule],
+    network: "TrainNetwork",
+    processes: EvaluationPool,
+    cache: FitnessCache,
+    fidelity: FidelitySchedule,
+    sample: TravellerSample,
+    generation: int,
+) -> list[DummySchedule]:
+    processes.set_network(network)
+    fitnesses = evaluate_pool_sampled(pool, processes, sample)
+    if fidelity.should_report(generation):
+        exact = evaluate_pool(pool, network, processes, cache)
+        fidelity.report.append(
+            (generation, sample.amountTravellers, spearman(fitnesses, exact))
+        )
+    return select_by_fitness(pool, fitnesses)
+
+
+def select_racing(
+    pool: list[DummySchedule],
+    network: "TrainNetwork",
+    processes: EvaluationPool,
+    cache: FitnessCache,
+    stats: RacingStats,
+) -> list[DummySchedule]:
+    # same selection as select, but candidates that can not reach the best part
+    # are not scored completely, they can still be picked for the random part
+    eliteSize = math.ceil(len(pool) / 4)
+    fitnesses = race(pool, network, processes, cache, eliteSize, stats)
+    if instrumentation.stats is not None:
+        instrumentation.stats.record_fitnesses(
+            [fitness for fitness in fitnesses if fitness is not None]
+        )
+    mappedSchedules = [
+        (i, fitness) for i, fitness in enumerate(fitnesses) if fitness is not None
+    ]
+    sortedSchedules = sorted(mappedSchedules, key=lambda x: x[1])
+    bestPart = sortedSchedules[:eliteSize]
+    bestIndices = {i for i, _ in bestPart}
+    randomPart = random.sample(
+        [i for i in range(len(pool)) if i not in bestIndices],
+        math.ceil(len(pool) / 2) - len(bestPart),
+    )
+    return [pool[i] for i, _ in bestPart] + [pool[i] for i in randomPart]
 
 
 def mutate(
     pool: list[DummySchedule],
     tsp: dict[tuple[int, int], "CompositeTrack"],
     cities: list[int],
-    processes: Pool,
+    processes: EvaluationPool,
 ) -> list[DummySchedule]:
-    newItems: list[DummySchedule] = processes.map(
-        functools.partial(mutateSchedule, tsp, cities), pool[:]
+    # only the city ids of the routes go to the workers and back, the children
+    # get their composite tracks from the tsp of this process
+    newGenomes: list[Genome] = processes.map(
+        functools.partial(mutate_genome, cities),
+        [to_genome(schedule) for schedule in pool],
     )
 
-    pool.extend(newItems)
+    pool.extend([from_genome(tsp, genome) for genome in newGenomes])
     return pool
 
 
-def mutateInsert(
-    item: list["CompositeTrack"],
-    tsp: dict[tuple[int, int], "CompositeTrack"],
-    cities: list[int],
-) -> list["CompositeTrack"]:
-    newRoute = item[:]
-    insertPosition = random.randint(-1, len(item))
-    cityToInsert = random.choice(cities)
-    if insertPosition == -1:
-        newRoute.insert(0, tsp[cityToInsert, item[0].start.id])
-    elif insertPosition == len(item):
-        newRoute.append(tsp[item[-1].end.id, cityToInsert])
-    else:
-        newTrack1 = tsp[item[insertPosition].start.id, cityToInsert]
-        newTrack2 = tsp[cityToInsert, item[insertPosition].end.id]
-        newRoute.pop(insertPosition)
-        newRoute.insert(insertPosition, newTrack1)
-        newRoute.insert(insertPosition + 1, newTrack2)
-    return newRoute
-
-
-def mutateDelete(
-    item: list["CompositeTrack"], tsp: dict[tuple[int, int], "CompositeTrack"]
-) -> list["CompositeTrack"]:
-    newRoute = item[:]
-    removePosition = random.randint(0, len(item))
-    if removePosition == 0:
-        newRoute.pop(0)
-    elif removePosition == len(item):
-        newRoute.pop(-1)
+class Island:
+    # a sub-population that evolves on its own in a worker process, sorted from
+    # best to worst after every epoch. its schedules are kept as genomes, so
+    # sending it to a worker does not send the network along
+    pool: list[Genome]
+    fitnesses: list[float]
+    cache: FitnessCache
+
+    def __init__(self, pool: list[Genome], cacheSize: int):
+        self.pool = pool
+        self.fitnesses = []
+        self.cache = FitnessCache(cacheSize)
+
+    def __str__(self) -> str:
+        return "Island of {} schedules, best {}".format(
+            len(self.pool), self.fitnesses[0] if len(self.fitnesses) > 0 else None
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def evolve_island(
+    network: "TrainNetwork", island: Island, amountGenerations: int, seed: int
+) -> Island:
+    # runs in a worker of the evaluation pool, the worker keeps the network and
+    # its shortest paths between epochs, so only the island is sent back and forth
+    random.seed(seed)
+    local = EvaluationPool(network, processes=0)
+    tsp = network.get_shortest_paths()
+    numberCities = cities_to_int(network.cities)
+    pool = [from_genome(tsp, genome) for genome in island.pool]
+    for _ in range(amountGenerations):
+        pool = select(pool, network, local, island.cache)
+        pool = mutate(pool, tsp, numberCities, local)
+    ranked = sorted(
+        zip(evaluate_pool(pool, network, local, island.cache), range(len(pool)))
+    )
+    island.pool = [to_genome(pool[i]) for _, i in ranked]
+    island.fitnesses = [fitness for fitness, _ in ranked]
+    return island
+
+
+def migrate(islands: list[Island], amountMigrants: int, topology: str):
+    # the best schedules of every island replace the worst ones of its neighbour.
+    # the random topology is a ring in a shuffled order, so no island is its own
+    # neighbour
+    if topology == "ring":
+        order = list(range(len(islands)))
+    elif topology == "random":
+        order = random.sample(range(len(islands)), len(islands))
     else:
-        newTrack = tsp[
-            newRoute[removePosition - 1].start.id, newRoute[removePosition].end.id
-        ]
-        newRoute.pop(removePosition)
-        newRoute.pop(removePosition - 1)
-        newRoute.insert(removePosition - 1, newTrack)
-    return newRoute
+        raise Exception("unknown migration topology {}".format(topology))
+    if len(islands) < 2:
+        return
+    targets = [0] * len(islands)
+    for k, i in enumerate(order):
+        targets[i] = order[(k + 1) % len(order)]
+    migrants = [
+        (island.pool[:amountMigrants], island.fitnesses[:amountMigrants])
+        for island in islands
+    ]
+    for (schedules, fitnesses), target in zip(migrants, targets):
+        island = islands[target]
+        keep = len(island.pool) - len(schedules)
+        island.pool = island.pool[:keep] + schedules
+        island.fitnesses = island.fitnesses[:keep] + fitnesses
+
+
+def run_islands(
+    islands: list[Island],
+    network: "TrainNetwork",
+    processes: EvaluationPool,
+    amountGenerations: int,
+    migrationInterval: int,
+    amountMigrants: int,
+    topology: str,
+) -> list[Island]:
+    epochs = math.ceil(amountGenerations / migrationInterval)
+    for epoch in tqdm(range(epochs)):
+        generations = min(
+            migrationInterval, amountGenerations - epoch * migrationInterval
+        )
+        islands = processes.starmap_network(
+            evolve_island,
+            [(island, generations, random.getrandbits(64)) for island in islands],
+        )
+        if epoch < epochs - 1:
+            migrate(islands, amountMigrants, topology)
+    return islands
+
+
+def breed_child(
+    network: "TrainNetwork", parent: Genome, seed: int
+) -> tuple[Genome, float]:
+    # mutates and scores a single child inside a worker of the evaluation pool
+    random.seed(seed)
+    child = mutate_genome(cities_to_int(network.cities), parent)
+    return child, evaluate_genome(network, child)
+
+
+def tournament(fitnesses: list[float], size: int, best: bool) -> int:
+    entrants = random.sample(range(len(fitnesses)), min(size, len(fitnesses)))
+    if best:
+        return min(entrants, key=lambda i: fitnesses[i])
+    return max(entrants, key=lambda i: fitnesses[i])
+
+
+def run_steady_state(
+    pool: list[DummySchedule],
+    fitnesses: list[float],
+    tsp: dict[tuple[int, int], "CompositeTrack"],
+    processes: EvaluationPool,
+    cache: FitnessCache,
+    evaluationBudget: int,
+    inFlight: int,
+    replacement: str,
+    tournamentSize: int,
+) -> int:
+    # keeps inFlight children in the workers, every scored child goes into the pool
+    # right away instead of waiting for the rest of its generation. returns the
+    # amount of children that were scored
+    if replacement not in ("worst", "tournament"):
+        raise Exception("unknown replacement {}".format(replacement))
+    results: queue.Queue = queue.Queue()
+
+    def submit():
+        parent = to_genome(pool[tournament(fitnesses, tournamentSize, True)])
+        processes.submit_network(
+            breed_child, (parent, random.getrandbits(64)), results.put, results.put
+        )
+
+    submitted = 0
+    for _ in range(min(inFlight, evaluationBudget)):
+        submit()
+        submitted += 1
+    with tqdm(total=evaluationBudget) as progress:
+        for _ in range(evaluationBudget):
+            result = results.get()
+            if isinstance(result, BaseException):
+                raise result
+            childGenome, fitness = result
+            child = from_genome(tsp, childGenome)
+            cache.put(schedule_key(child), fitness)
+            instrumentation.count("evaluations")
+            if replacement == "worst":
+                loser = max(range(len(fitnesses)), key=lambda i: fitnesses[i])
+            else:
+                loser = tournament(fitnesses, tournamentSize, False)
+            if fitness < fitnesses[loser]:
+                pool[loser] = child
+                fitnesses[loser] = fitness
+            progress.update()
+            if submitted < evaluationBudget:
+                submit()
+                submitted += 1
+    return evaluationBudget
 
 
 class EvolutionaryAlgorithm(Schedule):
+    fitnessCache: FitnessCache
+    deltaEvaluator: DeltaEvaluator | None
+    racingStats: RacingStats | None
+    fidelity: FidelitySchedule | None
+    islands: list[Island]
+    evaluations: int
+    evaluationsPerSecond: float
+    generationsRun: int
+    generationsSkipped: int
+    stopReason: str | None
+
     def __init__(
         self,
         inputNetwork: "TrainNetwork",
@@ -141,23 +386,271 @@ class EvolutionaryAlgorithm(Schedule):
         amountGenerations: int,
         poolSize: int,
         initSchedule: Schedule | None = None,
+        cacheSize: int = 4096,
+        deltaEvaluation: bool = False,
+        processes: EvaluationPool | None = None,
+        racing: bool = False,
+        fidelity: FidelitySchedule | None = None,
+        amountIslands: int = 0,
+        migrationInterval: int = 10,
+        amountMigrants: int = 2,
+        topology: str = "ring",
+        steadyState: bool = False,
+        evaluationBudget: int | None = None,
+        inFlight: int | None = None,
+        replacement: str = "worst",
+        tournamentSize: int = 2,
+        stopping: StoppingCriteria | None = None,
+        checkpointPath: str | None = None,
+        checkpointEvery: int = 10,
     ):
-        processes = multiprocessing.Pool()
-        tsp = network_to_TSP(inputNetwork.cities)
-        if initSchedule is not None:
-            pool = real_to_dummy([copy.deepcopy(initSchedule) for _ in range(poolSize)])
-        else:
-            pool = init_pool(tsp, poolSize, amountTrains)
-        numberCities = cities_to_int(inputNetwork.cities)
+        # with a checkpointPath the generational loop saves its state every
+        # checkpointEvery generations and resumes from that file when it exists.
+        # the file is removed once the run is done
+        if (stopping is not None or checkpointPath is not None) and (
+            steadyState or amountIslands > 0
+        ):
+            raise Exception(
+                "stopping criteria and checkpoints only work in the generational mode"
+            )
+        # in steady state mode amountGenerations only sets the default budget: as
+        # many children as the generational mode would make
+        if steadyState and (
+            racing or deltaEvaluation or fidelity is not None or amountIslands > 0
+        ):
+            raise Exception(
+                "steady state mode can not be combined with racing, delta or sampled evaluation or islands"
+            )
+        # with amountIslands > 0 every island has its own pool of poolSize
+        # schedules that evolves in a worker process, they only meet every
+        # migrationInterval generations
+        if amountIslands > 0 and (racing or deltaEvaluation or fidelity is not None):
+            raise Exception(
+                "the island model can not be combined with racing, delta or sampled evaluation"
+            )
+        if racing and deltaEvaluation:
+            raise Exception(
+                "racing selection can not be combined with delta evaluation"
+            )
+        if fidelity is not None and (racing or deltaEvaluation):
+            raise Exception(
+                "sampled evaluation can not be combined with racing or delta evaluation"
+            )
+        # a pool that is passed in stays open, so it can be reused by the caller
+        ownsProcesses = processes is None
+        if processes is None:
+            processes = EvaluationPool(inputNetwork)
+        processes.set_network(inputNetwork)
+        self.fitnessCache = FitnessCache(cacheSize)
+        self.deltaEvaluator = None
+        if deltaEvaluation:
+            self.deltaEvaluator = DeltaEvaluator(inputNetwork, cacheSize)
+        self.racingStats = RacingStats() if racing else None
+        self.fidelity = fidelity
+        self.islands = []
+        self.evaluations = 0
+        self.generationsRun = amountGenerations
+        self.generationsSkipped = 0
+        self.stopReason = None
+        startTime = time.perf_counter()
+        try:
+            tsp = inputNetwork.get_shortest_paths()
+            if initSchedule is not None:
+                pool = seed_pool(tsp, initSchedule, poolSize)
+            else:
+                pool = init_pool(tsp, poolSize, amountTrains)
+            numberCities = cities_to_int(inputNetwork.cities)
 
-        for _ in tqdm(range(amountGenerations)):
-            pool = select(pool, inputNetwork, processes)
-            pool = mutate(pool, tsp, numberCities, processes)
+            if steadyState:
+                if evaluationBudget is None:
+                    evaluationBudget = amountGenerations * (
+                        poolSize - math.ceil(poolSize / 2)
+                    )
+                if inFlight is None:
+                    inFlight = max(1, processes.processes * 2)
+                fitnesses = evaluate_pool(
+                    pool, inputNetwork, processes, self.fitnessCache
+                )
+                self.evaluations = self.fitnessCache.misses + run_steady_state(
+                    pool,
+                    fitnesses,
+                    tsp,
+                    processes,
+                    self.fitnessCache,
+                    evaluationBudget,
+                    inFlight,
+                    replacement,
+                    tournamentSize,
+                )
+            elif amountIslands > 0:
+                self.islands = [
+                    Island([to_genome(schedule) for schedule in pool], cacheSize)
+                ]
+                for _ in range(amountIslands - 1):
+                    if initSchedule is not None:
+                        islandPool = seed_pool(tsp, initSchedule, poolSize)
+                    else:
+                        islandPool = init_pool(tsp, poolSize, amountTrains)
+                    self.islands.append(
+                        Island(
+                            [to_genome(schedule) for schedule in islandPool],
+                            cacheSize,
+                        )
+                    )
+                self.islands = run_islands(
+                    self.islands,
+                    inputNetwork,
+                    processes,
+                    amountGenerations,
+                    migrationInterval,
+                    amountMigrants,
+                    topology,
+                )
+                pool = [
+                    from_genome(tsp, genome)
+                    for island in self.islands
+                    for genome in island.pool
+                ]
+                fitnesses = [
+                    fitness for island in self.islands for fitness in island.fitnesses
+                ]
+                for schedule, fitness in zip(pool, fitnesses):
+                    self.fitnessCache.put(schedule_key(schedule), fitness)
+            else:
+                # child i in the second half is a mutation of survivor i
+                parents: list[DummySchedule | None] = [None] * len(pool)
+                if fidelity is not None:
+                    strata = pair_strata(inputNetwork, fidelity.amountBuckets)
+                    rng = np.random.default_rng(random.getrandbits(64))
+                startGeneration = 0
+                elapsedBefore = 0.0
+                checkpoint = None
+                signature = inputNetwork.tracks_signature()
+                parameters = {
+                    "amountTrains": amountTrains,
+                    "amountGenerations": amountGenerations,
+                    "poolSize": poolSize,
+                }
+                if checkpointPath is not None:
+                    checkpoint = load_checkpoint(checkpointPath, signature, parameters)
+                if checkpoint is not None:
+                    startGeneration = checkpoint.generation
+                    elapsedBefore = checkpoint.elapsed
+                    pool = [key_to_schedule(tsp, key) for key in checkpoint.pool]
+                    random.setstate(checkpoint.randomState)
+                    if fidelity is not None and checkpoint.rngState is not None:
+                        rng.bit_generator.state = checkpoint.rngState
+                    if stopping is not None and checkpoint.stopping is not None:
+                        stopping = checkpoint.stopping
+                    parents = [None] * len(pool)
+                progress = tqdm(
+                    range(startGeneration, amountGenerations),
+                    initial=startGeneration,
+                    total=amountGenerations,
+                )
+                for generation in progress:
+                    with instrumentation.phase("select"):
+                        if (
+                            fidelity is not None
+                            and fidelity.fraction(generation, amountGenerations) < 1
+                        ):
+                            # a new sample every generation, so no schedule can overfit it
+                            sample = stratified_sample(
+                                inputNetwork,
+                                strata,
+                                fidelity.fraction(generation, amountGenerations),
+                                rng,
+                            )
+                            pool = select_sampled(
+                                pool,
+                                inputNetwork,
+                                processes,
+                                self.fitnessCache,
+                                fidelity,
+                                sample,
+                                generation,
+                            )
+                        elif self.racingStats is not None:
+                            pool = select_racing(
+                                pool,
+                                inputNetwork,
+                                processes,
+                                self.fitnessCache,
+                                self.racingStats,
+                            )
+                        else:
+                            pool = select(
+                                pool,
+                                inputNetwork,
+                                processes,
+                                self.fitnessCache,
+                                self.deltaEvaluator,
+                                parents,
+                            )
+                    if stopping is not None:
+                        # the survivors are sorted, so the first one is the best
+                        stopping.update(self.fitnessCache.peek(schedule_key(pool[0])))
+                        self.stopReason = stopping.reason(
+                            elapsedBefore + time.perf_counter() - startTime
+                        )
+                        if self.stopReason is not None:
+                            self.generationsRun = generation + 1
+                            self.generationsSkipped = (
+                                amountGenerations - self.generationsRun
+                            )
+                            break
+                    survivors = pool[:]
+                    with instrumentation.phase("mutate"):
+                        pool = mutate(pool, tsp, numberCities, processes)
+                    parents = [None] * len(survivors) + survivors
+                    if instrumentation.stats is not None:
+                        progress.set_postfix(
+                            instrumentation.stats.end_generation(generation)
+                        )
+                    if (
+                        checkpointPath is not None
+                        and (generation + 1) % checkpointEvery == 0
+                    ):
+                        save_checkpoint(
+                            checkpointPath,
+                            Checkpoint(
+                                signature,
+                                parameters,
+                                generation + 1,
+                                [schedule_key(schedule) for schedule in pool],
+                                random.getstate(),
+                                (
+                                    rng.bit_generator.state
+                                    if fidelity is not None
+                                    else None
+                                ),
+                                stopping,
+                                elapsedBefore + time.perf_counter() - startTime,
+                            ),
+                        )
+                if checkpointPath is not None:
+                    remove_checkpoint(checkpointPath)
 
-        realpool = dummy_to_real(pool)
-        mappedSchedules = list(
-            enumerate(processes.map(inputNetwork.get_average_travel_time, realpool))
-        )
-        sortedSchedules = sorted(mappedSchedules, key=lambda x: x[1])
+            if not steadyState:
+                # every cache miss is a schedule that was scored
+                self.evaluations = self.fitnessCache.misses + sum(
+                    [island.cache.misses for island in self.islands]
+                )
+            self.evaluationsPerSecond = self.evaluations / (
+                time.perf_counter() - startTime
+            )
+
+            # delta fitnesses are estimates, so the final ranking is always exact
+            finalCache = self.fitnessCache
+            if self.deltaEvaluator is not None:
+                finalCache = FitnessCache(len(pool))
+            mappedSchedules = list(
+                enumerate(evaluate_pool(pool, inputNetwork, processes, finalCache))
+            )
+            sortedSchedules = sorted(mappedSchedules, key=lambda x: x[1])
+        finally:
+            if ownsProcesses:
+                processes.close()
 
-        self.trainSchedules = realpool[sortedSchedules[0][0]].trainSchedules
+        bestSchedule = dummy_to_real([pool[sortedSchedules[0][0]]])[0]
+        self.trainSchedules = bestSchedule.trainSchedules
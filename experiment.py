@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import pickle
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any
+
+import numpy as np
+
+from evaluationPool import EvaluationPool
+from evolutionary import EvolutionaryAlgorithm
+from insertion import InsertionAlgorithm, RouteSplitError
+from network import TrainNetwork
+from resultStore import ResultStore
+from stopping import StoppingCriteria
+
+
+class TrialConfig:
+    amountCities: int
+    averageTracks: int
+    randomizerPasses: int
+    amountTravellers: int
+    amountSprinters: int
+    amountIntercities: int
+    amountTrains: int
+    amountGenerations: int
+    poolSize: int
+    initFromInsertion: bool
+    patience: int | None
+
+    def __init__(
+        self,
+        amountCities: int = 100,
+        averageTracks: int = 2,
+        randomizerPasses: int = 2,
+        amountTravellers: int = 500,
+        amountSprinters: int = 15,
+        amountIntercities: int = 5,
+        amountTrains: int = 20,
+        amountGenerations: int = 300,
+        poolSize: int = 50,
+        initFromInsertion: bool = True,
+        patience: int | None = None,
+    ):
+        self.amountCities = amountCities
+        self.averageTracks = averageTracks
+        self.randomizerPasses = randomizerPasses
+        self.amountTravellers = amountTravellers
+        self.amountSprinters = amountSprinters
+        self.amountIntercities = amountIntercities
+        self.amountTrains = amountTrains
+        self.amountGenerations = amountGenerations
+        self.poolSize = poolSize
+        self.initFromInsertion = initFromInsertion
+        self.patience = patience
+
+    def to_dict(self) -> dict[str, Any]:
+        return dict(self.__dict__)
+
+    def __str__(self) -> str:
+        return "TrialConfig {}".format(self.to_dict())
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def seed_everything(seed: str):
+    # string seeds are hashed with sha512 by random, so they do not depend on
+    # PYTHONHASHSEED and give the same stream on every machine
+    random.seed(seed)
+    np.random.seed(random.getrandbits(32))
+
+
+def run_trial(
+    config: TrialConfig, baseSeed: int, trial: int, maxAttempts: int = 100
+) -> dict[str, Any]:
+    start = time.perf_counter()
+    for attempt in range(maxAttempts):
+        seed = "{}:{}:{}".format(baseSeed, trial, attempt)
+        seed_everything(seed)
+        try:
+            network = TrainNetwork(
+                config.amountCities,
+                config.averageTracks,
+                config.randomizerPasses,
+                config.amountTravellers,
+            )
+            ins = InsertionAlgorithm(
+                network, config.amountSprinters, config.amountIntercities
+            )
+        except RouteSplitError:
+            # networks can no longer fall apart, but the intercity route of one
+            # with few popular cities can not always be split between the trains
+            continue
+        resultIns = network.get_average_travel_time(ins)
+        # trials already run in parallel, so each trial evaluates in its own process
+        with EvaluationPool(network, processes=0) as processes:
+            evo = EvolutionaryAlgorithm(
+                network,
+                config.amountTrains,
+                config.amountGenerations,
+                config.poolSize,
+                ins if config.initFromInsertion else None,
+                processes=processes,
+                stopping=(
+                    None
+                    if config.patience is None
+                    else StoppingCriteria(patience=config.patience)
+                ),
+            )
+            resultEvo = network.get_average_travel_time(evo)
+        return {
+            "trial": trial,
+            "seed": seed,
+            "attempts": attempt + 1,
+            "network": config.to_dict(),
+            "insertion": resultIns,
+            "evolutionary": resultEvo,
+            "generationsSkipped": evo.generationsSkipped,
+            "wallTime": time.perf_counter() - start,
+        }
+    raise Exception("could not generate a usable network for trial {}".format(trial))
+
+
+def read_checkpoint(checkpointPath: str) -> dict[int, dict[str, Any]]:
+    done: dict[int, dict[str, Any]] = dict()
+    if not os.path.exists(checkpointPath):
+        return done
+    with open(checkpointPath, "r") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line may be cut off by a crash while it was written
+                continue
+            done[record["trial"]] = record
+    return done
+
+
+def append_checkpoint(checkpointPath: str, record: dict[str, Any]):
+    with open(checkpointPath, "a") as file:
+        file.write(json.dumps(record) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def run_experiment(
+    config: TrialConfig,
+    checkpointPath: str,
+    amountTrials: int,
+    baseSeed: int = 0,
+    workers: int | None = None,
+) -> list[dict[str, Any]]:
+    done = read_checkpoint(checkpointPath)
+    todo = [trial for trial in range(amountTrials) if trial not in done]
+    if len(todo) > 0:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [
+                executor.submit(run_trial, config, baseSeed, trial) for trial in todo
+            ]
+            for future in as_completed(futures):
+                record = future.result()
+                append_checkpoint(checkpointPath, record)
+                done[record["trial"]] = record
+                print(
+                    "trial {} done in {:.1f}s ({}/{})".format(
+                        record["trial"], record["wallTime"], len(done), amountTrials
+                    )
+                )
+    return [done[trial] for trial in range(amountTrials)]
+
+
+def export_results(records: list[dict[str, Any]], filePath: str):
+    # same (insertion results, evolutionary results) pickle as the old __main__
+    resultsInsertion = [record["insertion"] for record in records]
+    resultsEvolutionary = [record["evolutionary"] for record in records]
+    with open(filePath, "wb+") as file:
+        pickle.dump((resultsInsertion, resultsEvolutionary), file)
+
+
+def export_store(records: list[dict[str, Any]], directory: str):
+    # one row per trial, only the trials that are not in the store yet are added
+    store = ResultStore(directory)
+    stored = {int(trial) for trial in store.column("trial").tolist()}
+    store.append_many([record for record in records if record["trial"] not in stored])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="run insertion vs evolutionary trials in parallel"
+    )
+    parser.add_argument("checkpoint", help="append-only file with finished trials")
+    parser.add_argument("--trials", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="also write the results as a pickle")
+    parser.add_argument("--store", help="also append the results to a result store")
+    parser.add_argument("--cities", type=int, default=100)
+    parser.add_argument("--travellers", type=int, default=500)
+    parser.add_argument("--generations", type=int, default=300)
+    parser.add_argument("--pool-size", type=int, default=50)
+    parser.add_argument(
+        "--patience", type=int, default=None, help="stop after k flat generations"
+    )
+    args = parser.parse_args()
+
+    config = TrialConfig(
+        amountCities=args.cities,
+        amountTravellers=args.travellers,
+        amountGenerations=args.generations,
+        poolSize=args.pool_size,
+        patience=args.patience,
+    )
+    records = run_experiment(
+        config, args.checkpoint, args.trials, args.seed, args.workers
+    )
+    if args.output is not None:
+        export_results(records, args.output)
+    if args.store is not None:
+        export_store(records, args.store)
@@ -0,0 +1,174 @@
+import math
+from typing import TYPE_CHECKING
+import numpy as np
+
+from genome import Genome, genome_schedule, to_genome
+
+if TYPE_CHECKING:
+    from compositeTrack import CompositeTrack
+    from evaluationPool import EvaluationPool
+    from network import TrainNetwork
+
+
+class TravellerSample:
+    # a stratified sample of the travellers, every sampled pair has a weight so
+    # that the weighted sum of its travel times estimates the average travel time
+    pairs: list[int]
+    weights: list[float]
+    amountTravellers: int
+
+    def __init__(self, pairs: list[int], weights: list[float], amountTravellers: int):
+        self.pairs = pairs
+        self.weights = weights
+        self.amountTravellers = amountTravellers
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    def __str__(self) -> str:
+        return "TravellerSample of {} travellers over {} pairs".format(
+            self.amountTravellers, len(self)
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def pair_strata(network: "TrainNetwork", amountBuckets: int = 3) -> np.ndarray:
+    # the cities are split in popularity buckets, a pair belongs to the stratum of
+    # its (origin bucket, destination bucket), so the pairs between popular
+    # cities, which carry most of the intercity travellers, always get sampled
+    popularity = np.array([city.popularity for city in network.cities])
+    edges = np.quantile(popularity, np.linspace(0, 1, amountBuckets + 1)[1:-1])
+    bucketOf = dict(
+        zip(
+            [city.id for city in network.cities],
+            np.searchsorted(edges, popularity).tolist(),
+        )
+    )
+    originBuckets = np.array([bucketOf[o] for o in network.demand.origins.tolist()])
+    destinationBuckets = np.array(
+        [bucketOf[d] for d in network.demand.destinations.tolist()]
+    )
+    return originBuckets * amountBuckets + destinationBuckets
+
+
+def stratified_sample(
+    network: "TrainNetwork",
+    strata: np.ndarray,
+    fraction: float,
+    rng: np.random.Generator,
+) -> TravellerSample:
+    counts = network.demand.counts
+    total = network.demand.total()
+    pairs: list[int] = []
+    weights: list[float] = []
+    amountTravellers = 0
+    for stratum in np.unique(strata).tolist():
+        stratumPairs = np.flatnonzero(strata == stratum)
+        stratumCounts = counts[stratumPairs]
+        stratumTotal = int(stratumCounts.sum())
+        # every stratum keeps at least one traveller
+        size = min(stratumTotal, max(1, round(stratumTotal * fraction)))
+        # travellers are drawn without replacement, so a pair is picked as often
+        # as the amount of its travellers that end up in the sample
+        sampled = rng.multivariate_hypergeometric(stratumCounts, size)
+        picked = np.flatnonzero(sampled)
+        pairs.extend(stratumPairs[picked].tolist())
+        weights.extend((sampled[picked] * (stratumTotal / size / total)).tolist())
+        amountTravellers += size
+    return TravellerSample(pairs, weights, amountTravellers)
+
+
+def evaluate_sample(
+    network: "TrainNetwork", genome: Genome, pairs: list[int], weights: list[float]
+) -> float:
+    travelTimes = network.get_travel_times(
+        genome_schedule(network, genome), pairs=pairs
+    )
+    return sum(
+        [travelTime * weight for travelTime, weight in zip(travelTimes, weights)]
+    )
+
+
+def evaluate_pool_sampled(
+    pool: list[list[list["CompositeTrack"]]],
+    processes: "EvaluationPool",
+    sample: TravellerSample,
+) -> list[float]:
+    return processes.starmap_network(
+        evaluate_sample,
+        [(to_genome(schedule), sample.pairs, sample.weights) for schedule in pool],
+    )
+
+
+def rank(values: list[float]) -> np.ndarray:
+    # ties get the average of their ranks
+    array = np.asarray(values, dtype=float)
+    order = np.argsort(array, kind="stable")
+    ranks = np.empty(len(array))
+    ranks[order] = np.arange(len(array))
+    _, inverse, tieCounts = np.unique(array, return_inverse=True, return_counts=True)
+    tieSums = np.bincount(inverse, weights=ranks)
+    return tieSums[inverse] / tieCounts[inverse]
+
+
+def spearman(a: list[float], b: list[float]) -> float:
+    rankA = rank(a)
+    rankB = rank(b)
+    rankA -= rankA.mean()
+    rankB -= rankB.mean()
+    denominator = math.sqrt(float((rankA**2).sum() * (rankB**2).sum()))
+    if denominator == 0:
+        return 1.0
+    return float((rankA * rankB).sum()) / denominator
+
+
+class FidelitySchedule:
+    # the sample starts at startFraction of the travellers and grows geometrically
+    # until it contains all travellers at fullAt of the generations, from then on
+    # the evaluation is exact. every reportEvery sampled generations the pool is
+    # also scored exactly to see how well the sample ranks the schedules
+    startFraction: float
+    fullAt: float
+    amountBuckets: int
+    reportEvery: int
+    report: list[tuple[int, int, float]]
+
+    def __init__(
+        self,
+        startFraction: float = 0.05,
+        fullAt: float = 0.75,
+        amountBuckets: int = 3,
+        reportEvery: int = 10,
+    ):
+        self.startFraction = startFraction
+        self.fullAt = fullAt
+        self.amountBuckets = amountBuckets
+        self.reportEvery = reportEvery
+        # (generation, sampled travellers, spearman correlation with exact fitness)
+        self.report = []
+
+    def fraction(self, generation: int, amountGenerations: int) -> float:
+        fullGeneration = self.fullAt * amountGenerations
+        if generation >= fullGeneration:
+            return 1.0
+        return self.startFraction ** (1 - generation / fullGeneration)
+
+    def should_report(self, generation: int) -> bool:
+        return self.reportEvery > 0 and generation % self.reportEvery == 0
+
+    def __str__(self) -> str:
+        lines = ["generation  travellers  spearman"]
+        for generation, amountTravellers, correlation in self.report:
+            lines.append(
+                "{:>10}  {:>10}  {:>8.3f}".format(
+                    generation, amountTravellers, correlation
+                )
+            )
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return "FidelitySchedule from {} to all travellers at {} of the generations".format(
+            self.startFraction, self.fullAt
+        )
@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from compositeTrack import CompositeTrack
+
+ScheduleKey = tuple[tuple[tuple[int, int], ...], ...]
+
+
+def schedule_key(trains: list[list["CompositeTrack"]]) -> ScheduleKey:
+    # two schedules with the same routes get the same fitness, no matter which
+    # CompositeTrack objects (or copies of them) the routes are made of
+    return tuple(
+        tuple((track.start.id, track.end.id) for track in route) for route in trains
+    )
+
+
+class FitnessCache:
+    maxSize: int
+    entries: OrderedDict[ScheduleKey, float]
+    hits: int
+    misses: int
+
+    def __init__(self, maxSize: int = 4096):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: ScheduleKey) -> float | None:
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def peek(self, key: ScheduleKey) -> float | None:
+        # a lookup that does not count as a hit or miss and keeps the order
+        return self.entries.get(key)
+
+    def put(self, key: ScheduleKey, fitness: float):
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return 0 if lookups == 0 else self.hits / lookups
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self) -> str:
+        return "FitnessCache {}/{} entries, {} hits, {} misses".format(
+            len(self.entries), self.maxSize, self.hits, self.misses
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
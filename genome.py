@@ -0,0 +1,71 @@
+import math
+import random
+from typing import TYPE_CHECKING
+import numpy as np
+
+from algorithmInterface import NoAlgorithmSchedule, TrainSchedule
+
+if TYPE_CHECKING:
+    from compositeTrack import CompositeTrack
+    from network import TrainNetwork
+
+# a train is the array of city ids it stops at, so a route of n composite tracks
+# is n + 1 ids. genomes are what crosses process boundaries, the composite
+# tracks are only looked up in the tsp of the process that needs them
+Genome = list[np.ndarray]
+
+
+def to_genome(schedule: list[list["CompositeTrack"]]) -> Genome:
+    return [
+        np.array(
+            [route[0].start.id] + [track.end.id for track in route], dtype=np.int32
+        )
+        for route in schedule
+    ]
+
+
+def from_genome(
+    tsp: dict[tuple[int, int], "CompositeTrack"], genome: Genome
+) -> list[list["CompositeTrack"]]:
+    schedule = []
+    for stops in genome:
+        ids = stops.tolist()
+        schedule.append([tsp[start, end] for start, end in zip(ids, ids[1:])])
+    return schedule
+
+
+def mutate_genome(cities: list[int], genome: Genome) -> Genome:
+    # half of the trains get a city inserted before, after or in the middle of one
+    # of their tracks, or lose a stop, which merges the two tracks around it
+    child = genome[:]
+    itemsToMutate = random.sample(list(enumerate(child)), math.ceil(len(child) / 2))
+    for j, stops in itemsToMutate:
+        chance = random.random()
+        if len(stops) == 2 or chance <= 0.5:
+            child[j] = insert_stop(stops, cities)
+        else:
+            child[j] = delete_stop(stops)
+    return child
+
+
+def insert_stop(stops: np.ndarray, cities: list[int]) -> np.ndarray:
+    insertPosition = random.randint(-1, len(stops) - 1)
+    cityToInsert = random.choice(cities)
+    return np.insert(stops, insertPosition + 1, cityToInsert)
+
+
+def delete_stop(stops: np.ndarray) -> np.ndarray:
+    removePosition = random.randint(0, len(stops) - 1)
+    return np.delete(stops, removePosition)
+
+
+def genome_schedule(network: "TrainNetwork", genome: Genome) -> NoAlgorithmSchedule:
+    # runs in a worker, whose network keeps its tsp between tasks
+    tsp = network.get_shortest_paths()
+    return NoAlgorithmSchedule(
+        [TrainSchedule(False, route) for route in from_genome(tsp, genome)]
+    )
+
+
+def evaluate_genome(network: "TrainNetwork", genome: Genome) -> float:
+    return network.get_average_travel_time(genome_schedule(network, genome))
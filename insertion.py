@@ -3,68 +3,113 @@ from algorithmInterface import Schedule, TrainSchedule
 from typing import TYPE_CHECKING
 from citiesToInt import cities_to_int
 
-from compositeTrack import CompositeTrack, network_to_TSP
+from compositeTrack import CompositeTrack, ShortestPaths
+import numpy as np
 
 if TYPE_CHECKING:
-    from network import TrainNetwork, City
+    from network import TrainNetwork
+
+
+def distance_matrix(
+    tsp: dict[tuple[int, int], "CompositeTrack"], toVisit: list[int]
+) -> np.ndarray:
+    if isinstance(tsp, ShortestPaths):
+        return tsp.distance_matrix(toVisit)
+    return np.array(
+        [[tsp[i, j].totalDistance for j in toVisit] for i in toVisit], dtype=np.int64
+    )
+
+
+def cheapest_insertion(dist: np.ndarray) -> list[tuple[int, int]]:
+    # returns the route as (start, end) indices into dist
+    # every unvisited city remembers its cheapest insertion edge, so after an
+    # insertion only the two new edges have to be checked, except for the cities
+    # whose cheapest edge was the one that got split. ties are broken like the
+    # old nested min: lowest cost, then earliest edge on the route, then the
+    # first city in toVisit
+    amount = len(dist)
+    # get the largest track
+    first, second = divmod(int(np.argmax(dist)), amount)
+    edgeStart = np.zeros(2 * amount, dtype=np.int64)
+    edgeEnd = np.zeros(2 * amount, dtype=np.int64)
+    position = np.zeros(2 * amount, dtype=np.int64)
+    edgeStart[0] = first
+    edgeEnd[0] = second
+    amountEdges = 1
+    route = [0]
+
+    unvisited = np.ones(amount, dtype=bool)
+    unvisited[[first, second]] = False
+    bestCost = dist[first, :] + dist[:, second] + 10 - dist[first, second]
+    bestEdge = np.zeros(amount, dtype=np.int64)
+
+    remaining = np.flatnonzero(unvisited)
+    while len(remaining) > 0:
+        costs = bestCost[remaining]
+        cheapest = remaining[costs == costs.min()]
+        if len(cheapest) > 1:
+            positions = position[bestEdge[cheapest]]
+            cheapest = cheapest[positions == positions.min()]
+        middle = int(cheapest[0])
+        edge = int(bestEdge[middle])
+        newEdges = (amountEdges, amountEdges + 1)
+        edgeStart[newEdges[0]] = edgeStart[edge]
+        edgeEnd[newEdges[0]] = middle
+        edgeStart[newEdges[1]] = middle
+        edgeEnd[newEdges[1]] = edgeEnd[edge]
+        amountEdges += 2
+        index = int(position[edge])
+        route[index : index + 1] = newEdges
+        routeEdges = np.array(route)
+        position[routeEdges] = np.arange(len(route))
+
+        unvisited[middle] = False
+        remaining = np.flatnonzero(unvisited)
+        split = bestEdge[remaining] == edge
+        others = remaining[~split]
+        for newEdge in newEdges:
+            start = edgeStart[newEdge]
+            end = edgeEnd[newEdge]
+            cost = dist[start, others] + dist[others, end] + 10 - dist[start, end]
+            current = bestCost[others]
+            better = (cost < current) | (
+                (cost == current) & (position[newEdge] < position[bestEdge[others]])
+            )
+            bestCost[others[better]] = cost[better]
+            bestEdge[others[better]] = newEdge
+
+        lost = remaining[split]
+        if len(lost) > 0:
+            starts = edgeStart[routeEdges]
+            ends = edgeEnd[routeEdges]
+            costs = (
+                dist[starts[:, None], lost[None, :]]
+                + dist[lost[None, :], ends[:, None]]
+                + 10
+                - dist[starts, ends][:, None]
+            )
+            # argmin returns the first minimum, which is the earliest edge
+            best = np.argmin(costs, axis=0)
+            bestCost[lost] = costs[best, np.arange(len(lost))]
+            bestEdge[lost] = routeEdges[best]
+
+    return [(int(edgeStart[edge]), int(edgeEnd[edge])) for edge in route]
 
 
 def perform_insertion_algorirthm(
     tsp: dict[tuple[int, int], "CompositeTrack"],
     toVisit: list[int],
 ) -> list["CompositeTrack"]:
-    toVisit = toVisit[:]
-    if len(tsp) == 0:
+    if len(tsp) == 0 or len(toVisit) == 0:
         return []
-    # get the smallest track that is not self
-    largestTrack = max(
-        [tsp[i, j] for i in toVisit for j in toVisit],
-        key=lambda x: x.totalDistance,
-    )
-    route = [largestTrack]
-    toVisit.remove(largestTrack.start.id)
-    toVisit.remove(largestTrack.end.id)
-    while len(toVisit) != 0:
-        (index, track), (middle, cost) = min(
-            [
-                (
-                    (trackIndex, track),
-                    min(
-                        [
-                            (
-                                cityId,
-                                (
-                                    tsp[track.start.id, cityId].totalDistance
-                                    + tsp[cityId, track.end.id].totalDistance
-                                    + 10
-                                )
-                                - track.totalDistance,
-                            )
-                            for cityId in toVisit
-                        ],
-                        key=lambda x: x[1],
-                    ),
-                )
-                for trackIndex, track in enumerate(route)
-            ],
-            key=lambda x: x[1][1],
-        )
-        newTrack1 = tsp[track.start.id, middle]
-        newTrack2 = tsp[middle, track.end.id]
-        toVisit.remove(middle)
-        route.pop(index)
-        route.insert(index, newTrack1)
-        route.insert(index + 1, newTrack2)
+    route = cheapest_insertion(distance_matrix(tsp, toVisit))
     # we now have an optimal route
-    return route
+    return [tsp[toVisit[start], toVisit[end]] for start, end in route]
 
 
 def get_route(
-    cities: list["City"], toVisit: list[int], amount: int
+    tsp: dict[tuple[int, int], "CompositeTrack"], toVisit: list[int], amount: int
 ) -> tuple[list["CompositeTrack"], int]:
-    # get rid of none type because our network does not have unreachable nodes
-    tsp = network_to_TSP(cities)
-    tsp = {k: v for k, v in tsp.items() if k[0] in toVisit and k[1] in toVisit}
     composedRoute = perform_insertion_algorirthm(tsp, toVisit)
     length = math.floor(get_total_length(composedRoute) / amount)
     return composedRoute, length
@@ -77,6 +122,10 @@ def get_total_length(tracks: list["CompositeTrack"]):
     return total
 
 
+class RouteSplitError(Exception):
+    pass
+
+
 def get_final_routes(
     route: list["CompositeTrack"],
     singleRouteLength: int,
@@ -95,6 +144,12 @@ def get_final_routes(
             newRoute.append(track)
             totalLength += track.totalDistance + 10
             trackIndex += 1
+        if len(newRoute) == 0:
+            # there are fewer tracks than trains, or a track is longer than the
+            # share of two trains
+            raise RouteSplitError(
+                "can not split the route into {} trains".format(amountTrains)
+            )
         newSchedule = TrainSchedule(isInterCity, newRoute)
         schedules.append(newSchedule)
         scheduleIndex += 1
@@ -115,7 +170,7 @@ class InsertionAlgorithm(Schedule):
                 filter(lambda x: x.get_skewed_popularity(3) >= 0.7, inputNetwork.cities)
             )
             tspRouteIntercity, intercityLength = get_route(
-                inputNetwork.cities,
+                inputNetwork.get_shortest_paths(),
                 cities_to_int(interCityToVisit),
                 amountIntercities,
             )
@@ -127,7 +182,7 @@ class InsertionAlgorithm(Schedule):
             finalRouteSprinter = []
         else:
             tspRouteSprinter, sprinterLength = get_route(
-                inputNetwork.cities,
+                inputNetwork.get_shortest_paths(),
                 cities_to_int(inputNetwork.cities),
                 amountSprinters,
             )
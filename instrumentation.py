@@ -0,0 +1,160 @@
+import cProfile
+import contextlib
+import math
+import os
+import statistics
+import time
+from collections import defaultdict
+from typing import Iterator
+
+# the stats of the current process, None while instrumentation is disabled. the
+# checks against None are the only cost of the instrumentation when it is off
+stats: "Stats | None" = None
+
+
+class Stats:
+    # counters and phase timers of the current process. the workers of an
+    # evaluation pool count every task in a stats of its own, which the pool
+    # merges into the stats of the process that handed out the task
+    counters: defaultdict[str, int]
+    peaks: set[str]
+    timers: defaultdict[str, float]
+    calls: defaultdict[str, int]
+    generations: list[tuple[int, float, float, float]]
+    profileDirectory: str | None
+    profilePhases: set[str]
+    profileCount: defaultdict[str, int]
+    lastFitnesses: list[float]
+    lastEvaluations: int
+    lastTime: float
+
+    def __init__(
+        self, profileDirectory: str | None = None, profilePhases: set[str] = set()
+    ):
+        self.counters = defaultdict(int)
+        self.peaks = set()
+        self.timers = defaultdict(float)
+        self.calls = defaultdict(int)
+        # (generation, best, median, evaluations per second)
+        self.generations = []
+        self.profileDirectory = profileDirectory
+        self.profilePhases = set(profilePhases)
+        self.profileCount = defaultdict(int)
+        self.lastFitnesses = []
+        self.lastEvaluations = 0
+        self.lastTime = time.perf_counter()
+
+    def merge(self, other: "Stats"):
+        # the phases of the workers overlap, so together they can take longer than
+        # the run itself
+        for name, value in other.counters.items():
+            if name in other.peaks:
+                self.peaks.add(name)
+                self.counters[name] = max(self.counters[name], value)
+            else:
+                self.counters[name] += value
+        for name, seconds in other.timers.items():
+            self.timers[name] += seconds
+        for name, amount in other.calls.items():
+            self.calls[name] += amount
+
+    def record_fitnesses(self, fitnesses: list[float]):
+        self.lastFitnesses = fitnesses
+
+    def end_generation(self, generation: int) -> dict[str, str]:
+        now = time.perf_counter()
+        evaluations = self.counters["evaluations"] - self.lastEvaluations
+        evaluationsPerSecond = evaluations / max(now - self.lastTime, 1e-9)
+        self.lastEvaluations = self.counters["evaluations"]
+        self.lastTime = now
+        best = min(self.lastFitnesses) if len(self.lastFitnesses) > 0 else math.nan
+        median = (
+            statistics.median(self.lastFitnesses)
+            if len(self.lastFitnesses) > 0
+            else math.nan
+        )
+        self.generations.append((generation, best, median, evaluationsPerSecond))
+        return {
+            "best": "{:.1f}".format(best),
+            "median": "{:.1f}".format(median),
+            "eval/s": "{:.1f}".format(evaluationsPerSecond),
+        }
+
+    def __str__(self) -> str:
+        lines = ["counters:"]
+        for name, value in sorted(self.counters.items()):
+            lines.append("  {:<24}{:>14}".format(name, value))
+        lines.append("phases:")
+        for name, seconds in sorted(self.timers.items(), key=lambda x: -x[1]):
+            lines.append(
+                "  {:<24}{:>10.3f}s {:>8} calls".format(name, seconds, self.calls[name])
+            )
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return "Stats with {} counters and {} phases".format(
+            len(self.counters), len(self.timers)
+        )
+
+
+def enable(
+    profileDirectory: str | None = None, profilePhases: set[str] = set()
+) -> Stats:
+    # phases in profilePhases are run under cProfile, every run is dumped to
+    # profileDirectory/<phase>-<n>.prof
+    global stats
+    stats = Stats(profileDirectory, profilePhases)
+    if profileDirectory is not None:
+        os.makedirs(profileDirectory, exist_ok=True)
+    return stats
+
+
+def disable() -> "Stats | None":
+    global stats
+    previous = stats
+    stats = None
+    return previous
+
+
+def count(name: str, amount: int = 1):
+    if stats is not None:
+        stats.counters[name] += amount
+
+
+def peak(name: str, value: int):
+    if stats is not None:
+        stats.peaks.add(name)
+        if value > stats.counters[name]:
+            stats.counters[name] = value
+
+
+@contextlib.contextmanager
+def timed_phase(current: Stats, name: str) -> Iterator[None]:
+    profiler = None
+    if name in current.profilePhases and current.profileDirectory is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.timers[name] += time.perf_counter() - start
+        current.calls[name] += 1
+        if profiler is not None:
+            profiler.disable()
+            current.profileCount[name] += 1
+            profiler.dump_stats(
+                os.path.join(
+                    current.profileDirectory,
+                    "{}-{}.prof".format(name, current.profileCount[name]),
+                )
+            )
+
+
+disabledPhase = contextlib.nullcontext()
+
+
+def phase(name: str) -> contextlib.AbstractContextManager:
+    if stats is None:
+        return disabledPhase
+    return timed_phase(stats, name)
@@ -2,19 +2,98 @@ from collections import defaultdict
 import pickle
 import matplotlib.pyplot as plt
 import random
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, cast
 from evolutionary import EvolutionaryAlgorithm
 from traveller import Traveller
 from insertion import InsertionAlgorithm
 from pyvis.network import Network
 from priorityQueue import PriorityQueue
+from compositeTrack import ShortestPaths, network_to_TSP
+from networkGenerator import (
+    ContractedNetwork,
+    GeneratedNetwork,
+    block_size,
+    generate_network,
+)
+from demand import DemandMatrix, demand_from_travellers, generate_demand
+import numpy as np
 import math
+import instrumentation
 
 if TYPE_CHECKING:
-    from algorithmInterface import Schedule, Node
+    from algorithmInterface import Schedule, TravellerGraph
+    from compositeTrack import CompositeTrack
 
 trackID = 0
 
+# travel time, trains taken and time of arrival at the destination
+Journey = tuple[int, frozenset[int], int]
+
+
+def earliest_arrival_search(
+    travellerNetwork: "TravellerGraph",
+    start: int,
+    destinations: set[int],
+    queueType: type = PriorityQueue,
+) -> dict[int, Journey]:
+    # one node is actualy many nodes with t-values equal to t + 0c ... t + xc
+    # each "sub"-node s  of node n is identified by its t and x value where ts = tn + xcn
+    # sub-nodes si and sj of neighbouring nodes ni and nj are neighbours
+    # when tj - cj <= ti < tj with distance tj - ti
+    # the search keeps going until every destination has been popped once, so the
+    # travel time to each destination is the same as with a search for that city alone
+    tValue, cValue, city, train, offsets, targets = travellerNetwork.as_lists()
+    queue: PriorityQueue[tuple[int, int]] = queueType()
+    visited = [0] * len(tValue)
+    prev: dict[tuple[int, int], tuple[int, int]] = dict()
+    remaining = set(destinations)
+    journeys: dict[int, Journey] = {
+        destination: (int(1e9), frozenset(), int(1e9)) for destination in destinations
+    }
+    counting = instrumentation.stats is not None
+    popped = 0
+    relaxed = 0
+    heapSize = 0
+    for v in travellerNetwork.departures_from(start):
+        queue.insert((v, 0), tValue[v])
+    while len(queue) > 0 and len(remaining) > 0:
+        if counting:
+            heapSize = max(heapSize, len(queue))
+        try:
+            cost, (v, vx) = queue.pop()
+        except IndexError:
+            break
+        visited[v] += 1
+        if counting:
+            popped += 1
+            relaxed += offsets[v + 1] - offsets[v]
+        if city[v] in remaining:
+            first = (v, vx)
+            trains = {train[v]}
+            while first in prev:
+                first = prev[first]
+                trains.add(train[first[0]])
+            journeys[city[v]] = (cost - tValue[first[0]], frozenset(trains), cost)
+            remaining.remove(city[v])
+        for n in targets[offsets[v] : offsets[v + 1]]:
+            # calculate x value
+            lowerBound = (cost - tValue[n]) / cValue[n]
+            nx = math.ceil(lowerBound)
+            if nx == lowerBound:
+                nx += 1
+            if (
+                visited[n] < 2
+            ):  # we don't need to check for cost, because each subnode can only have a single cost
+                prev[n, nx] = (v, vx)
+                newTotalCost = tValue[n] + nx * cValue[n]
+                queue.modify((n, nx), newTotalCost)
+    if counting:
+        instrumentation.count("searches")
+        instrumentation.count("nodes popped", popped)
+        instrumentation.count("edges relaxed", relaxed)
+        instrumentation.peak("peak heap size", heapSize)
+    return journeys
+
 
 class Track:
     cost: int
@@ -48,9 +127,9 @@ class City:
     neighbours: dict["City", "Track"]
     id: int
 
-    def __init__(self):
+    def __init__(self, popularity: float | None = None):
         global cityID
-        self.popularity = random.random()
+        self.popularity = random.random() if popularity is None else popularity
         self.id = cityID
         cityID += 1
         self.neighbours = {}
@@ -77,7 +156,13 @@ class City:
 class TrainNetwork:
     cities: list["City"]
     tracks: list["Track"]
+    # only filled for networks that are not vectorized, evaluation uses the demand
     travellers: list["Traveller"]
+    demand: DemandMatrix
+    shortestPaths: ShortestPaths | None
+    shortestPathsSignature: np.ndarray | None
+    # queue used by the earliest arrival search, see the benchmark in priorityQueue.py
+    queueType: type = PriorityQueue
 
     # average tracks must be even
     # the more passes, the more random the network will be, but also the bigger the effect of the popularity scores of the cities
@@ -87,13 +172,43 @@ class TrainNetwork:
         averageTracks: int,
         randomizerPasses: int,
         amountTravellers: int,
+        vectorized: bool = False,
     ):
         self.cities = []
         self.tracks = []
         self.travellers = []
-        self.__init_cities(amountCities)
-        self.__init_tracks(averageTracks, randomizerPasses)
-        self.__init_travellers(amountTravellers)
+        self.shortestPaths = None
+        self.shortestPathsSignature = None
+        if vectorized:
+            rng = np.random.default_rng(random.getrandbits(64))
+            self.__init_generated(
+                generate_network(amountCities, averageTracks, randomizerPasses, rng)
+            )
+            # the demand is drawn in batches and never turned into Traveller objects
+            self.demand = generate_demand(
+                np.array([city.popularity for city in self.cities]),
+                np.array([city.id for city in self.cities], dtype=np.int64),
+                amountTravellers,
+                rng,
+            )
+        else:
+            self.__init_cities(amountCities)
+            self.__init_tracks(averageTracks, randomizerPasses)
+            self.__init_travellers(amountTravellers)
+            self.demand = demand_from_travellers(self.travellers)
+
+    def __init_generated(self, generated: GeneratedNetwork):
+        # the objects are only made once all random choices have been made
+        self.cities = [City(popularity) for popularity in generated.popularity.tolist()]
+        for (start, end), cost in zip(
+            generated.trackEnds.tolist(), generated.trackCost.tolist()
+        ):
+            city1 = self.cities[start]
+            city2 = self.cities[end]
+            track = Track(cost, (city1, city2))
+            city1.neighbours[city2] = track
+            city2.neighbours[city1] = track
+            self.tracks.append(track)
 
     def __init_cities(self, amountCities):
         for i in range(amountCities):
@@ -122,39 +237,60 @@ class TrainNetwork:
             self.tracks.extend(nexTracks)
 
         # make the network random
+        position = {city.id: i for i, city in enumerate(self.cities)}
+        blockSize = block_size(len(self.tracks))
         for _ in range(passes):
-            for track in self.tracks:
-                city1 = track.connects[0]
-                city2 = track.connects[1]
-
-                nextCity = random.choice(self.cities)
-                notFound = True
-                maxTries = len(self.cities)
-                tries = 0
-                while notFound:
-                    # prevent edge case where city has track to every other city
-                    if tries > maxTries:
-                        break
-                    if city1.id == nextCity.id or nextCity in city1.neighbours:
-                        nextCity = random.choice(self.cities)
-                        tries += 1
-                    else:
-                        notFound = False
-                if notFound:
-                    continue
-
-                chance = random.random()
-                if (
-                    nextCity.get_skewed_popularity(4) < chance
-                    or len(city2.neighbours) == 1
-                ):
-                    continue
-
-                city1.neighbours.pop(city2)
-                city2.neighbours.pop(city1)
-                track.connects = (city1, nextCity)
-                city1.neighbours[nextCity] = track
-                nextCity.neighbours[city1] = track
+            for first in range(0, len(self.tracks), blockSize):
+                trackEnds = np.array(
+                    [
+                        [position[city.id] for city in track.connects]
+                        for track in self.tracks
+                    ]
+                )
+                contracted = ContractedNetwork(
+                    len(self.cities), trackEnds, first, first + blockSize
+                )
+                for track in self.tracks[first : first + blockSize]:
+                    city1 = track.connects[0]
+                    city2 = track.connects[1]
+
+                    nextCity = random.choice(self.cities)
+                    notFound = True
+                    maxTries = len(self.cities)
+                    tries = 0
+                    while notFound:
+                        # prevent edge case where city has track to every other city
+                        if tries > maxTries:
+                            break
+                        if city1.id == nextCity.id or nextCity in city1.neighbours:
+                            nextCity = random.choice(self.cities)
+                            tries += 1
+                        else:
+                            notFound = False
+                    if notFound:
+                        continue
+
+                    chance = random.random()
+                    if (
+                        nextCity.get_skewed_popularity(4) < chance
+                        or len(city2.neighbours) == 1
+                        # a rewire that would split the network is never made
+                        or not contracted.stays_connected(
+                            position[city1.id],
+                            position[city2.id],
+                            position[nextCity.id],
+                        )
+                    ):
+                        continue
+
+                    contracted.move(
+                        position[city1.id], position[city2.id], position[nextCity.id]
+                    )
+                    city1.neighbours.pop(city2)
+                    city2.neighbours.pop(city1)
+                    track.connects = (city1, nextCity)
+                    city1.neighbours[nextCity] = track
+                    nextCity.neighbours[city1] = track
 
     def __init_travellers(self, amountTravellers):
         while len(self.travellers) < amountTravellers:
@@ -179,53 +315,172 @@ class TrainNetwork:
             newTraveller = Traveller(city, otherCity)
             self.travellers.append(newTraveller)
 
-    def get_average_travel_time(self, schedule: "Schedule"):
-        travellerNetwork = schedule.traveler_network()
-        totalTime = 0
-        for traveller in self.travellers:
-            # one node is actualy many nodes with t-values equal to t + 0c ... t + xc
-            # each "sub"-node s  of node n is identified by its t and x value where ts = tn + xcn
-            # sub-nodes si and sj of neighbouring nodes ni and nj are neighbours
-            # when tj - cj <= ti < tj with distance tj - ti
-            queue: PriorityQueue[tuple["Node", int]] = PriorityQueue()
-            visited: dict[int, int] = defaultdict(lambda: 0)
-            startingNodes, _ = travellerNetwork[traveller.start.id]
-            prev: dict[tuple["Node", int], tuple["Node", int]] = dict()
-            last: tuple["Node", int] | None = None
-            totalCost: int = int(1e9)
-            for v in startingNodes:
-                queue.insert((v, 0), v.tValue)
-            while len(queue) > 0:
-                cost, (v, vx) = queue.pop()
-                visited[v.id] += 1
-                if v.isPartOf.id == traveller.destination.id:
-                    totalCost = cost
-                    last = (v, vx)
-                    break
-                for n in v.canGoTo:
-                    # calculate x value
-                    lowerBound = (cost - n.tValue) / n.cValue
-                    nx = math.ceil(lowerBound)
-                    if nx == lowerBound:
-                        nx += 1
-                    if (
-                        visited[n.id] < 2
-                    ):  # we don't need to check for cost, because each subnode can only have a single cost
-                        prev[n, nx] = (v, vx)
-                        newTotalCost = n.tValue + nx * n.cValue
-                        queue.modify((n, nx), newTotalCost)
-            if last == None:
-                totalTime += totalCost
-            else:
-                path = [last]
-                while True:
-                    if last not in prev:
-                        break
-                    last = prev[last]
-                    path.append(last)
-                path = list(reversed(path))
-                totalTime += totalCost - path[0][0].tValue
-        return totalTime / len(self.travellers)
+    def tracks_signature(self) -> np.ndarray:
+        return np.array(
+            [
+                (track.id, track.connects[0].id, track.connects[1].id, track.cost)
+                for track in self.tracks
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 4)
+
+    def get_shortest_paths(self) -> dict[tuple[int, int], "CompositeTrack"]:
+        # the all-pairs result is only recomputed when the tracks have changed
+        signature = self.tracks_signature()
+        if (
+            self.shortestPaths is None
+            or self.shortestPathsSignature is None
+            or not np.array_equal(signature, self.shortestPathsSignature)
+        ):
+            with instrumentation.phase("network_to_TSP"):
+                self.shortestPaths = cast(ShortestPaths, network_to_TSP(self.cities))
+            self.shortestPathsSignature = signature
+        return cast(dict[tuple[int, int], "CompositeTrack"], self.shortestPaths)
+
+    def set_track_cost(self, track: Track, cost: int):
+        # what-if changes update the shortest paths in place, instead of running
+        # network_to_TSP again
+        if self.shortestPaths is None:
+            track.cost = cost
+            return
+        self.shortestPaths.set_track_cost(track, cost)
+        self.shortestPathsSignature = self.tracks_signature()
+
+    def remove_track(self, track: Track):
+        self.tracks.remove(track)
+        if self.shortestPaths is None:
+            track.connects[0].neighbours.pop(track.connects[1])
+            track.connects[1].neighbours.pop(track.connects[0])
+            return
+        self.shortestPaths.remove_track(track)
+        self.shortestPathsSignature = self.tracks_signature()
+
+    def add_track(self, city1: City, city2: City, cost: int) -> Track:
+        if city2 in city1.neighbours:
+            raise Exception("there already is a track between these cities")
+        track = Track(cost, (city1, city2))
+        self.tracks.append(track)
+        if self.shortestPaths is None:
+            city1.neighbours[city2] = track
+            city2.neighbours[city1] = track
+            return track
+        self.shortestPaths.add_track(track)
+        self.shortestPathsSignature = self.tracks_signature()
+        return track
+
+    def invalidate_shortest_paths(self):
+        self.shortestPaths = None
+        self.shortestPathsSignature = None
+
+    def save(self, filePath: str, withShortestPaths: bool = True):
+        with open(filePath, "wb+") as file:
+            pickle.dump(self, file)
+        if withShortestPaths:
+            shortestPaths = cast(ShortestPaths, self.get_shortest_paths())
+            np.savez(
+                filePath + ".tsp.npz",
+                dist=shortestPaths.dist,
+                pred=shortestPaths.pred,
+                signature=self.tracks_signature(),
+            )
+
+    @staticmethod
+    def load(filePath: str) -> "TrainNetwork":
+        with open(filePath, "rb") as file:
+            network: TrainNetwork = pickle.load(file)
+        try:
+            stored = np.load(filePath + ".tsp.npz")
+        except FileNotFoundError:
+            return network
+        # a stale file (the tracks changed after saving) is simply ignored
+        if np.array_equal(stored["signature"], network.tracks_signature()):
+            network.shortestPaths = ShortestPaths(
+                network.cities, stored["dist"], stored["pred"]
+            )
+            network.shortestPathsSignature = stored["signature"]
+        return network
+
+    def __getstate__(self):
+        # the all-pairs result is large and not needed to evaluate schedules,
+        # so it is only written to disk explicitly by save
+        state = self.__dict__.copy()
+        state["shortestPaths"] = None
+        state["shortestPathsSignature"] = None
+        return state
+
+    def get_average_travel_time(
+        self, schedule: "Schedule", groupByOrigin: bool = True
+    ) -> float:
+        travelTimes = self.get_travel_times(schedule, groupByOrigin)
+        instrumentation.count("travellers evaluated", self.demand.total())
+        # every origin-destination pair counts as often as it has travellers
+        totalTime = sum(
+            [
+                travelTime * count
+                for travelTime, count in zip(travelTimes, self.demand.counts.tolist())
+            ]
+        )
+        return totalTime / self.demand.total()
+
+    def get_travel_times(
+        self,
+        schedule: "Schedule",
+        groupByOrigin: bool = True,
+        pairs: list[int] | None = None,
+    ) -> list[int]:
+        return [
+            travelTime
+            for travelTime, _, _ in self.get_journeys(schedule, groupByOrigin, pairs)
+        ]
+
+    def get_arrival_times(
+        self,
+        schedule: "Schedule",
+        groupByOrigin: bool = True,
+        pairs: list[int] | None = None,
+    ) -> list[int]:
+        return [
+            arrival
+            for _, _, arrival in self.get_journeys(schedule, groupByOrigin, pairs)
+        ]
+
+    def get_journeys(
+        self,
+        schedule: "Schedule",
+        groupByOrigin: bool = True,
+        pairs: list[int] | None = None,
+    ) -> list[Journey]:
+        # one journey per origin-destination pair of the demand, or per pair in pairs
+        origins = self.demand.origins.tolist()
+        destinations = self.demand.destinations.tolist()
+        if pairs is None:
+            pairs = list(range(len(self.demand)))
+        with instrumentation.phase("traveler_network"):
+            travellerNetwork = schedule.traveler_network()
+        if not groupByOrigin:
+            with instrumentation.phase("search"):
+                return [
+                    earliest_arrival_search(
+                        travellerNetwork,
+                        origins[pair],
+                        {destinations[pair]},
+                        self.queueType,
+                    )[destinations[pair]]
+                    for pair in pairs
+                ]
+
+        # travellers from the same city share a single one-to-all search
+        destinationsPerOrigin: dict[int, set[int]] = defaultdict(set)
+        for pair in pairs:
+            destinationsPerOrigin[origins[pair]].add(destinations[pair])
+        with instrumentation.phase("search"):
+            journeysPerOrigin = {
+                origin: earliest_arrival_search(
+                    travellerNetwork, origin, destinationSet, self.queueType
+                )
+                for origin, destinationSet in destinationsPerOrigin.items()
+            }
+        return [journeysPerOrigin[origins[pair]][destinations[pair]] for pair in pairs]
 
     def visualize(self):
         net = Network()
@@ -242,32 +497,11 @@ class TrainNetwork:
 
 
 if __name__ == "__main__":
-    resultsInsertion = []
-    resultsEvolutionary = []
-    for i in range(100):
-        while True:
-            try:
-                network = TrainNetwork(100, 2, 2, 500)
-                ins = InsertionAlgorithm(network, 15, 5)
-                resultIns = network.get_average_travel_time(ins)
-                evo = EvolutionaryAlgorithm(network, 20, 300, 50, ins)
-                resultEvo = network.get_average_travel_time(evo)
-                # network.visualize()
-                # print("insertion value: " + str(resultIns))
-                # print(ins)
-                # print("\n")
-                # print("evolution value: " + str(resultEvo))
-                # print(evo)
-                resultsInsertion.append(resultIns)
-                resultsEvolutionary.append(resultEvo)
-                break
-            except:
-                cityID = 0
-                continue
-        print(i)
+    from experiment import TrialConfig, export_results, run_experiment
 
-    with open("results_300gen_initb", "wb+") as file:
-        pickle.dump((resultsInsertion, resultsEvolutionary), file)
+    # finished trials are kept in the checkpoint, so an interrupted run resumes
+    records = run_experiment(TrialConfig(), "results_300gen_initb.jsonl", 100)
+    export_results(records, "results_300gen_initb")
 
 # ideas:
 # try initialize evo pool with solution from insertion
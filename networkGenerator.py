@@ -0,0 +1,226 @@
+from collections import defaultdict
+from typing import Callable, Hashable, Iterable, TypeVar
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+CityType = TypeVar("CityType", bound=Hashable)
+
+
+class GeneratedNetwork:
+    # array-only network: city i has popularity[i], track t connects the cities
+    # trackEnds[t, 0] and trackEnds[t, 1] and costs trackCost[t]
+    popularity: np.ndarray
+    trackEnds: np.ndarray
+    trackCost: np.ndarray
+
+    def __init__(
+        self, popularity: np.ndarray, trackEnds: np.ndarray, trackCost: np.ndarray
+    ):
+        self.popularity = popularity
+        self.trackEnds = trackEnds
+        self.trackCost = trackCost
+
+    def __str__(self) -> str:
+        return "GeneratedNetwork with {} cities and {} tracks".format(
+            len(self.popularity), len(self.trackEnds)
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def stays_connected(
+    neighboursOf: Callable[[CityType], Iterable[CityType]],
+    city1: CityType,
+    city2: CityType,
+    nextCity: CityType,
+) -> bool:
+    # moving the track city1-city2 to city1-nextCity keeps a connected network
+    # connected when city2 can still reach city1 without the track, or when
+    # nextCity is on the side of city2. both sides are searched a level at a time,
+    # the smaller one first, so the search stops after the smaller side when the
+    # track is a bridge, and when the two searches meet otherwise
+    seen = [{city1}, {city2}]
+    frontiers = [set(neighboursOf(city1)), set(neighboursOf(city2))]
+    frontiers[0].discard(city2)
+    frontiers[1].discard(city1)
+    if nextCity == city2 or nextCity in frontiers[1]:
+        return True
+    seen[0] |= frontiers[0]
+    seen[1] |= frontiers[1]
+    if not frontiers[0].isdisjoint(frontiers[1]):
+        return True
+    while True:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        if len(frontiers[side]) == 0:
+            # this whole side has been found and the other side was not in it
+            return (nextCity in seen[side]) == (side == 1)
+        level: set[CityType] = set()
+        for city in frontiers[side]:
+            level.update(neighboursOf(city))
+        level -= seen[side]
+        # meeting the other side, or nextCity on the side of city2
+        if not level.isdisjoint(seen[1 - side]) or (side == 1 and nextCity in level):
+            return True
+        seen[side] |= level
+        frontiers[side] = level
+
+
+def block_size(amountTracks: int) -> int:
+    # about 32 blocks per pass, every block costs one pass over all tracks
+    return max(256, amountTracks // 32)
+
+
+class ContractedNetwork:
+    # a rewiring pass moves the tracks one after the other, so while the tracks
+    # first to last are rewired all other tracks stay where they are. the cities
+    # those tracks connect are merged into components once, in compiled code, and
+    # a rewire only has to search the components and the links between them that
+    # the tracks of the block make
+    component: list[int]
+    links: defaultdict[int, dict[int, int]]
+
+    def __init__(self, amountCities: int, trackEnds: np.ndarray, first: int, last: int):
+        fixed = np.ones(len(trackEnds), dtype=bool)
+        fixed[first:last] = False
+        graph = coo_matrix(
+            (
+                np.ones(int(fixed.sum()), dtype=np.int8),
+                (trackEnds[fixed, 0], trackEnds[fixed, 1]),
+            ),
+            shape=(amountCities, amountCities),
+        )
+        _, labels = connected_components(graph, directed=False)
+        self.component = labels.tolist()
+        self.links = defaultdict(dict)
+        for city1, city2 in trackEnds[first:last].tolist():
+            self.add_link(self.component[city1], self.component[city2])
+
+    def add_link(self, a: int, b: int):
+        if a != b:
+            self.links[a][b] = self.links[a].get(b, 0) + 1
+            self.links[b][a] = self.links[b].get(a, 0) + 1
+
+    def remove_link(self, a: int, b: int):
+        if a != b:
+            for x, y in ((a, b), (b, a)):
+                self.links[x][y] -= 1
+                if self.links[x][y] == 0:
+                    del self.links[x][y]
+
+    def stays_connected(self, city1: int, city2: int, nextCity: int) -> bool:
+        a = self.component[city1]
+        b = self.component[city2]
+        # a track within a component or next to another link between the same
+        # components is not a bridge, so the network can not fall apart
+        if a == b or self.links[a][b] > 1:
+            return True
+        return stays_connected(self.links.__getitem__, a, b, self.component[nextCity])
+
+    def move(self, city1: int, city2: int, nextCity: int):
+        self.remove_link(self.component[city1], self.component[city2])
+        self.add_link(self.component[city1], self.component[nextCity])
+
+    def __str__(self) -> str:
+        return "ContractedNetwork with {} components linked by the block".format(
+            len(self.links)
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def generate_lattice(
+    amountCities: int, averageTracks: int, rng: np.random.Generator
+) -> tuple[np.ndarray, np.ndarray]:
+    # every city gets a track to the next averageTracks / 2 cities on the ring,
+    # in the same order as TrainNetwork builds them
+    averageTracks = int(averageTracks / 2)
+    starts = np.repeat(np.arange(amountCities), averageTracks)
+    steps = np.tile(np.arange(1, averageTracks + 1), amountCities)
+    trackEnds = np.stack((starts, (starts + steps) % amountCities), axis=1)
+    trackCost = rng.integers(30, 100, len(trackEnds))
+    return trackEnds, trackCost
+
+
+def rewire(
+    popularity: np.ndarray,
+    trackEnds: np.ndarray,
+    passes: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    # same model as TrainNetwork.__init_tracks: every pass moves the far end of
+    # each track to a random city that is not yet a neighbour, accepted with
+    # chance popularity ** 4, unless the old far end would be left with one track
+    # or the network would fall apart.
+    # the targets and chances are drawn per pass in one batch, only the
+    # bookkeeping of the neighbours is sequential
+    amountCities = len(popularity)
+    trackEnds = trackEnds.copy()
+    starts: list[int] = trackEnds[:, 0].tolist()
+    ends: list[int] = trackEnds[:, 1].tolist()
+    neighbours: list[set[int]] = [set() for _ in range(amountCities)]
+    for city1, city2 in zip(starts, ends):
+        neighbours[city1].add(city2)
+        neighbours[city2].add(city1)
+    acceptance = popularity**4
+    maxTries = amountCities
+    blockSize = block_size(len(starts))
+
+    for _ in range(passes):
+        targets = rng.integers(0, amountCities, len(starts))
+        chances = rng.random(len(starts))
+        accepted = (acceptance[targets] >= chances).tolist()
+        chances = chances.tolist()
+        targets = targets.tolist()
+        for first in range(0, len(starts), blockSize):
+            last = min(first + blockSize, len(starts))
+            contracted = ContractedNetwork(amountCities, trackEnds, first, last)
+            for track in range(first, last):
+                nextCity = targets[track]
+                city1 = starts[track]
+                city2 = ends[track]
+                if nextCity == city1 or nextCity in neighbours[city1]:
+                    # the batch target is taken, so draw again one at a time
+                    nextCity = -1
+                    tries = 1
+                    # prevent edge case where city has track to every other city
+                    while tries <= maxTries:
+                        candidate = int(rng.integers(0, amountCities))
+                        tries += 1
+                        if candidate != city1 and candidate not in neighbours[city1]:
+                            nextCity = candidate
+                            break
+                    if nextCity == -1:
+                        continue
+                    if acceptance[nextCity] < chances[track]:
+                        continue
+                elif not accepted[track]:
+                    continue
+
+                if len(neighbours[city2]) == 1 or not contracted.stays_connected(
+                    city1, city2, nextCity
+                ):
+                    continue
+
+                contracted.move(city1, city2, nextCity)
+                neighbours[city1].remove(city2)
+                neighbours[city2].remove(city1)
+                neighbours[city1].add(nextCity)
+                neighbours[nextCity].add(city1)
+                ends[track] = nextCity
+                trackEnds[track, 1] = nextCity
+    return trackEnds
+
+
+def generate_network(
+    amountCities: int,
+    averageTracks: int,
+    passes: int,
+    rng: np.random.Generator,
+) -> GeneratedNetwork:
+    popularity = rng.random(amountCities)
+    trackEnds, trackCost = generate_lattice(amountCities, averageTracks, rng)
+    trackEnds = rewire(popularity, trackEnds, passes, rng)
+    return GeneratedNetwork(popularity, trackEnds, trackCost)
@@ -1,4 +1,5 @@
 import heapq
+from collections import OrderedDict
 from typing import Any, Generic, TypeVar
 
 T = TypeVar("T")
@@ -38,3 +39,196 @@ class PriorityQueue(Generic[T]):
 
     def __len__(self):
         return len(self.queue)
+
+
+class IndexedPriorityQueue(Generic[T]):
+    # binary heap that knows where every item is, so modify and delete work in place
+    # items with the same priority come out in the order they were last inserted
+    # or modified, just like with PriorityQueue
+    heap: list[tuple[int, int, T]]
+    position: dict[T, int]
+    currentId: int
+
+    def __init__(self):
+        self.heap = []
+        self.position = dict()
+        self.currentId = 0
+
+    def insert(self, item: T, priority: int):
+        if item in self.position:
+            self.modify(item, priority)
+            return
+        self.heap.append((priority, self.currentId, item))
+        self.currentId += 1
+        self.position[item] = len(self.heap) - 1
+        self.__sift_up(len(self.heap) - 1)
+
+    def pop(self) -> tuple[int, T]:
+        if len(self.heap) == 0:
+            raise IndexError("queue is empty")
+        priority, _, item = self.heap[0]
+        self.__remove_at(0)
+        return (priority, item)
+
+    def delete(self, item: T):
+        if item in self.position:
+            self.__remove_at(self.position[item])
+
+    def modify(self, item: T, newPriority: int):
+        if item not in self.position:
+            self.insert(item, newPriority)
+            return
+        index = self.position[item]
+        oldPriority = self.heap[index][0]
+        self.heap[index] = (newPriority, self.currentId, item)
+        self.currentId += 1
+        # the new id is always larger, so only a lower priority moves the item up
+        if newPriority < oldPriority:
+            self.__sift_up(index)
+        else:
+            self.__sift_down(index)
+
+    def __remove_at(self, index: int):
+        item = self.heap[index][2]
+        last = self.heap.pop()
+        del self.position[item]
+        if index == len(self.heap):
+            return
+        self.heap[index] = last
+        self.position[last[2]] = index
+        self.__sift_up(index)
+        self.__sift_down(self.position[last[2]])
+
+    def __sift_up(self, index: int):
+        heap = self.heap
+        entry = heap[index]
+        while index > 0:
+            parent = (index - 1) >> 1
+            if heap[parent][:2] <= entry[:2]:
+                break
+            heap[index] = heap[parent]
+            self.position[heap[index][2]] = index
+            index = parent
+        heap[index] = entry
+        self.position[entry[2]] = index
+
+    def __sift_down(self, index: int):
+        heap = self.heap
+        size = len(heap)
+        entry = heap[index]
+        while True:
+            child = 2 * index + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1][:2] < heap[child][:2]:
+                child += 1
+            if entry[:2] <= heap[child][:2]:
+                break
+            heap[index] = heap[child]
+            self.position[heap[index][2]] = index
+            index = child
+        heap[index] = entry
+        self.position[entry[2]] = index
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class BucketQueue(Generic[T]):
+    # a bucket per integer priority, for small non-negative integer priorities
+    # all items in a bucket share one entry in a heap of priorities, so there are
+    # far fewer heap operations than items. within a bucket the items keep the
+    # order in which they were last inserted or modified, like PriorityQueue
+    buckets: dict[int, OrderedDict[T, None]]
+    bucketHeap: list[int]
+    priorities: dict[T, int]
+
+    def __init__(self):
+        self.buckets = dict()
+        self.bucketHeap = []
+        self.priorities = dict()
+
+    def insert(self, item: T, priority: int):
+        if item in self.priorities:
+            self.delete(item)
+        bucket = self.buckets.get(priority)
+        if bucket is None:
+            bucket = OrderedDict()
+            self.buckets[priority] = bucket
+            heapq.heappush(self.bucketHeap, priority)
+        bucket[item] = None
+        self.priorities[item] = priority
+
+    def pop(self) -> tuple[int, T]:
+        if len(self.priorities) == 0:
+            raise IndexError("queue is empty")
+        # buckets emptied by delete are only removed from the heap here
+        while self.bucketHeap[0] not in self.buckets:
+            heapq.heappop(self.bucketHeap)
+        priority = self.bucketHeap[0]
+        bucket = self.buckets[priority]
+        item, _ = bucket.popitem(last=False)
+        if len(bucket) == 0:
+            del self.buckets[priority]
+            heapq.heappop(self.bucketHeap)
+        del self.priorities[item]
+        return (priority, item)
+
+    def delete(self, item: T):
+        if item not in self.priorities:
+            return
+        priority = self.priorities.pop(item)
+        bucket = self.buckets[priority]
+        del bucket[item]
+        if len(bucket) == 0:
+            del self.buckets[priority]
+
+    def modify(self, item: T, newPriority: int):
+        self.insert(item, newPriority)
+
+    def __len__(self):
+        return len(self.priorities)
+
+
+if __name__ == "__main__":
+    # micro-benchmark of the queues, on a synthetic workload and on the search
+    # in TrainNetwork.get_average_travel_time
+    import random
+    import time
+    from insertion import InsertionAlgorithm
+    from network import TrainNetwork
+
+    queueTypes: list[type] = [PriorityQueue, IndexedPriorityQueue, BucketQueue]
+
+    def synthetic(queueType: type, operations: int = 100000) -> float:
+        # like dijkstra, new priorities are never below the last popped one and
+        # many updates are for items that are already in the queue
+        random.seed(0)
+        queue = queueType()
+        current = 0
+        start = time.perf_counter()
+        for _ in range(operations):
+            for _ in range(3):
+                queue.modify(
+                    random.randrange(operations // 10),
+                    current + random.randrange(1, 200),
+                )
+            current, _ = queue.pop()
+        return time.perf_counter() - start
+
+    for queueType in queueTypes:
+        print("synthetic {}: {:.3f}s".format(queueType.__name__, synthetic(queueType)))
+
+    random.seed(4)
+    network = TrainNetwork(100, 2, 2, 500)
+    schedule = InsertionAlgorithm(network, 15, 5)
+    for queueType in queueTypes:
+        network.queueType = queueType
+        start = time.perf_counter()
+        for _ in range(5):
+            result = network.get_average_travel_time(schedule)
+        print(
+            "search {}: {:.3f}s, average travel time {}".format(
+                queueType.__name__, time.perf_counter() - start, result
+            )
+        )
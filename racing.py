@@ -0,0 +1,140 @@
+import math
+import random
+from collections import defaultdict
+from typing import TYPE_CHECKING, cast
+
+from compositeTrack import ShortestPaths
+from fitnessCache import FitnessCache, ScheduleKey, schedule_key
+from genome import Genome, genome_schedule, to_genome
+
+if TYPE_CHECKING:
+    from compositeTrack import CompositeTrack
+    from evaluationPool import EvaluationPool
+    from network import TrainNetwork
+
+
+class RacingStats:
+    races: int
+    eliminated: int
+    fullyScored: int
+    pairsEvaluated: int
+    pairsSaved: int
+    searchesSaved: int
+
+    def __init__(self):
+        self.races = 0
+        self.eliminated = 0
+        self.fullyScored = 0
+        self.pairsEvaluated = 0
+        self.pairsSaved = 0
+        # one traveller-search per traveller of a pair that was not evaluated
+        self.searchesSaved = 0
+
+    def __str__(self) -> str:
+        return "RacingStats {} eliminated, {} fully scored, {} traveller-searches saved".format(
+            self.eliminated, self.fullyScored, self.searchesSaved
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def pair_lower_bounds(network: "TrainNetwork") -> list[int]:
+    # nobody can travel faster than the shortest path over the tracks
+    tsp = cast(ShortestPaths, network.get_shortest_paths())
+    origins = [tsp.index[origin] for origin in network.demand.origins.tolist()]
+    destinations = [
+        tsp.index[destination] for destination in network.demand.destinations.tolist()
+    ]
+    return tsp.dist[origins, destinations].tolist()
+
+
+def evaluate_pairs(network: "TrainNetwork", genome: Genome, pairs: list[int]) -> int:
+    travelTimes = network.get_travel_times(
+        genome_schedule(network, genome), pairs=pairs
+    )
+    counts = network.demand.counts.tolist()
+    return sum(
+        [travelTime * counts[pair] for travelTime, pair in zip(travelTimes, pairs)]
+    )
+
+
+def race(
+    pool: list[list[list["CompositeTrack"]]],
+    network: "TrainNetwork",
+    processes: "EvaluationPool",
+    cache: FitnessCache,
+    eliteSize: int,
+    stats: RacingStats,
+    stages: int = 4,
+) -> list[float | None]:
+    # scores the candidates on a growing part of the origins (1/8, 1/4, 1/2, all
+    # for 4 stages). a candidate whose lower bound is already worse than eliteSize
+    # exact fitnesses can not get into the elite and is dropped. returns the
+    # exact fitness per candidate, or None for the dropped ones
+    processes.set_network(network)
+    stats.races += 1
+    keys = [schedule_key(schedule) for schedule in pool]
+    uniqueSchedules = dict(zip(keys, pool))
+    cache.hits += len(keys) - len(uniqueSchedules)
+    exact: dict[ScheduleKey, float] = dict()
+    for key in uniqueSchedules:
+        fitness = cache.get(key)
+        if fitness is not None:
+            exact[key] = fitness
+    racing = [key for key in uniqueSchedules if key not in exact]
+
+    counts = network.demand.counts.tolist()
+    total = network.demand.total()
+    lowerBounds = pair_lower_bounds(network)
+    pairsPerOrigin: dict[int, list[int]] = defaultdict(list)
+    for pair, origin in enumerate(network.demand.origins.tolist()):
+        pairsPerOrigin[origin].append(pair)
+    origins = list(pairsPerOrigin)
+    random.shuffle(origins)
+    boundaries = [
+        math.ceil(len(origins) / 2 ** (stages - 1 - stage)) for stage in range(stages)
+    ]
+
+    partial = {key: 0 for key in racing}
+    remainingBound = sum([bound * count for bound, count in zip(lowerBounds, counts)])
+    remainingPairs = len(counts)
+    remainingTravellers = total
+    done = 0
+    for boundary in boundaries:
+        stageOrigins = origins[done:boundary]
+        done = boundary
+        if len(stageOrigins) == 0:
+            continue
+        stagePairs = [
+            pair for origin in stageOrigins for pair in pairsPerOrigin[origin]
+        ]
+
+        knownFitnesses = sorted([exact[key] for key in keys if key in exact])
+        if len(knownFitnesses) >= eliteSize:
+            threshold = knownFitnesses[eliteSize - 1]
+            for key in racing[:]:
+                if (partial[key] + remainingBound) / total > threshold:
+                    racing.remove(key)
+                    stats.eliminated += 1
+                    stats.pairsSaved += remainingPairs
+                    stats.searchesSaved += remainingTravellers
+        if len(racing) == 0:
+            break
+
+        sums = processes.starmap_network(
+            evaluate_pairs,
+            [(to_genome(uniqueSchedules[key]), stagePairs) for key in racing],
+        )
+        stats.pairsEvaluated += len(stagePairs) * len(racing)
+        for key, stageSum in zip(racing, sums):
+            partial[key] += stageSum
+        remainingBound -= sum([lowerBounds[pair] * counts[pair] for pair in stagePairs])
+        remainingPairs -= len(stagePairs)
+        remainingTravellers -= sum([counts[pair] for pair in stagePairs])
+
+    for key in racing:
+        exact[key] = partial[key] / total
+        cache.put(key, exact[key])
+        stats.fullyScored += 1
+    return [exact.get(key) for key in keys]
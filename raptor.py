@@ -0,0 +1,261 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from algorithmInterface import Schedule, TrainSchedule
+    from network import TrainNetwork
+
+UNREACHED = int(1e9)
+
+
+class PeriodicRoute:
+    # a train as a cycle of legs (departure, arrival, from city, to city) that
+    # repeats every period, with the legs sorted by departure time
+    period: int
+    departures: list[int]
+    durations: list[int]
+    gaps: list[int]
+    continues: list[bool]
+    fromCities: list[int]
+    toCities: list[int]
+
+    def __init__(self, schedule: "TrainSchedule"):
+        self.period = 2 * (schedule.totalLength + 10)
+        legs = sorted(
+            (dep, arr, start.id, end.id)
+            for start, outGoingTracks in schedule.cities.items()
+            for end, tracks in outGoingTracks.items()
+            for dep, arr in tracks
+        )
+        self.departures = [dep for dep, _, _, _ in legs]
+        self.durations = [arr - dep for dep, arr, _, _ in legs]
+        self.fromCities = [start for _, _, start, _ in legs]
+        self.toCities = [end for _, _, _, end in legs]
+        # time between the departure of the previous leg and this one
+        self.gaps = [
+            dep - self.departures[i - 1] if i > 0 else dep + self.period - legs[-1][0]
+            for i, dep in enumerate(self.departures)
+        ]
+        # the times of the way back do not always line up with the way there, so
+        # the train can only be ridden on into a leg that leaves from the city the
+        # previous leg arrived at, after it arrived
+        self.continues = [
+            self.fromCities[i] == self.toCities[i - 1]
+            and self.gaps[i] > self.durations[i - 1]
+            for i in range(len(legs))
+        ]
+
+    def next_departure(self, leg: int, time: int) -> int:
+        # first departure of the leg strictly after time, like the x value of a sub-node
+        x = (time - self.departures[leg]) // self.period + 1
+        return self.departures[leg] + max(x, 0) * self.period
+
+
+class RaptorEvaluator:
+    # round-based earliest arrival without a priority queue, one round per
+    # stretch of train taken. the travel times are the same as those of the
+    # dijkstra search in TrainNetwork: that search counts from the departure its
+    # search tree traces back to, where every departure hangs below the latest
+    # arrival at its city in the period before it. the rounds only give the
+    # earliest arrivals, so a scan over the departures in time order builds the
+    # same tree up to the last arrival that is needed
+    network: "TrainNetwork"
+    rounds: int
+
+    def __init__(self, network: "TrainNetwork"):
+        self.network = network
+        self.rounds = 0
+
+    def get_average_travel_time(self, schedule: "Schedule") -> float:
+        travelTimes = self.get_travel_times(schedule)
+        totalTime = sum(
+            [
+                travelTime * count
+                for travelTime, count in zip(
+                    travelTimes, self.network.demand.counts.tolist()
+                )
+            ]
+        )
+        return totalTime / self.network.demand.total()
+
+    def get_travel_times(
+        self, schedule: "Schedule", pairs: list[int] | None = None
+    ) -> list[int]:
+        return [travelTime for travelTime, _ in self.get_times(schedule, pairs)]
+
+    def get_arrival_times(
+        self, schedule: "Schedule", pairs: list[int] | None = None
+    ) -> list[int]:
+        return [arrival for _, arrival in self.get_times(schedule, pairs)]
+
+    def get_times(
+        self, schedule: "Schedule", pairs: list[int] | None = None
+    ) -> list[tuple[int, int]]:
+        # travel time and earliest arrival of every pair
+        origins = self.network.demand.origins.tolist()
+        destinations = self.network.demand.destinations.tolist()
+        if pairs is None:
+            pairs = list(range(len(self.network.demand)))
+        routes = [PeriodicRoute(train) for train in schedule.trainSchedules]
+        stopRoutes: dict[int, set[int]] = defaultdict(set)
+        for r, route in enumerate(routes):
+            for city in route.fromCities:
+                stopRoutes[city].add(r)
+
+        destinationsPerOrigin: dict[int, set[int]] = defaultdict(set)
+        for pair in pairs:
+            destinationsPerOrigin[origins[pair]].add(destinations[pair])
+        timesPerOrigin = dict()
+        for origin, destinationSet in destinationsPerOrigin.items():
+            arrival = self.scan(routes, stopRoutes, origin)
+            timesPerOrigin[origin] = self.trace(routes, origin, destinationSet, arrival)
+        return [
+            timesPerOrigin[origins[pair]].get(
+                destinations[pair], (UNREACHED, UNREACHED)
+            )
+            for pair in pairs
+        ]
+
+    def scan(
+        self,
+        routes: list[PeriodicRoute],
+        stopRoutes: dict[int, set[int]],
+        origin: int,
+    ) -> dict[int, int]:
+        # earliest arrival at every city. at the origin only the departures of
+        # the first period can be taken, like the starting nodes of the dijkstra
+        # search
+        arrival: dict[int, int] = dict()
+        marked = {origin}
+        while len(marked) > 0:
+            self.rounds += 1
+            improved: set[int] = set()
+            toScan = set().union(*[stopRoutes[city] for city in marked])
+            for r in toScan:
+                route = routes[r]
+                legs = len(route.departures)
+                rideDeparture = UNREACHED
+                # two times around the cycle, so boarding at any leg can reach every
+                # other leg of the train
+                for step in range(2 * legs):
+                    leg = step % legs
+                    if step > 0:
+                        if route.continues[leg]:
+                            rideDeparture += route.gaps[leg]
+                        else:
+                            rideDeparture = UNREACHED
+                    city = route.fromCities[leg]
+                    if city in marked:
+                        if city == origin:
+                            board = route.departures[leg]
+                        else:
+                            board = route.next_departure(leg, arrival[city])
+                        rideDeparture = min(rideDeparture, board)
+                    if rideDeparture >= UNREACHED:
+                        continue
+                    target = route.toCities[leg]
+                    if target == origin:
+                        continue
+                    arrivalTime = rideDeparture + route.durations[leg]
+                    if target not in arrival or arrivalTime < arrival[target]:
+                        arrival[target] = arrivalTime
+                        improved.add(target)
+            marked = improved
+        return arrival
+
+    def trace(
+        self,
+        routes: list[PeriodicRoute],
+        origin: int,
+        destinations: set[int],
+        arrival: dict[int, int],
+    ) -> dict[int, tuple[int, int]]:
+        # every departure that leaves before the last earliest arrival, in time
+        # order. a departure is reached when a reached arrival at its city lies in
+        # the period before it, and then hangs below the latest of those arrivals.
+        # departures of the first period from the origin are reached anyway. like
+        # the search, a leg stops taking new arrivals or departures once two of its
+        # periods have been reached
+        reachedDestinations = [city for city in destinations if city in arrival]
+        if len(reachedDestinations) == 0:
+            return dict()
+        horizon = max(arrival[city] for city in reachedDestinations)
+        connections = []
+        for r, route in enumerate(routes):
+            for leg, departure in enumerate(route.departures):
+                period = 0
+                while departure + period < horizon:
+                    connections.append((departure + period, period == 0, r, leg))
+                    period += route.period
+        connections.sort()
+
+        # per city the reached arrivals as (time, connection), sorted
+        arrivals: dict[int, list[tuple[int, int]]] = defaultdict(list)
+        # per leg the times its departures and arrivals were reached
+        legDepartures: dict[tuple[int, int], list[int]] = defaultdict(list)
+        legArrivals: dict[tuple[int, int], list[int]] = defaultdict(list)
+        departures: list[int] = []
+        previous: list[int] = []
+        for departure, firstPeriod, r, leg in connections:
+            route = routes[r]
+            city = route.fromCities[leg]
+            before = -1
+            latest = departure
+            if len(legDepartures[r, leg]) >= 2:
+                latest = min(latest, legDepartures[r, leg][1] + 1)
+            reached = arrivals[city]
+            i = bisect_left(reached, (latest,))
+            if i > 0 and reached[i - 1][0] >= departure - route.period:
+                before = reached[i - 1][1]
+            elif not (city == origin and firstPeriod):
+                continue
+            legDepartures[r, leg].append(departure)
+            connection = len(departures)
+            departures.append(departure)
+            previous.append(before)
+            taken = legArrivals[r, leg]
+            if len(taken) >= 2 and taken[1] < departure:
+                continue
+            arrivalTime = departure + route.durations[leg]
+            taken.append(arrivalTime)
+            insort(arrivals[route.toCities[leg]], (arrivalTime, connection))
+
+        times = dict()
+        for city in reachedDestinations:
+            # the first of the earliest arrivals is what the search pops first
+            reached = arrivals[city]
+            connection = reached[bisect_left(reached, (arrival[city],))][1]
+            while previous[connection] != -1:
+                connection = previous[connection]
+            times[city] = (arrival[city] - departures[connection], arrival[city])
+        return times
+
+
+if __name__ == "__main__":
+    # cross-check against the dijkstra engine
+    import random
+    import time
+    from insertion import InsertionAlgorithm
+    from network import TrainNetwork
+
+    random.seed(4)
+    network = TrainNetwork(100, 2, 2, 500)
+    schedule = InsertionAlgorithm(network, 15, 5)
+    raptor = RaptorEvaluator(network)
+
+    start = time.perf_counter()
+    dijkstraArrivals = network.get_arrival_times(schedule)
+    dijkstraDuration = time.perf_counter() - start
+    start = time.perf_counter()
+    raptorArrivals = raptor.get_arrival_times(schedule)
+    raptorDuration = time.perf_counter() - start
+    print("dijkstra: {:.3f}s".format(dijkstraDuration))
+    print("raptor: {:.3f}s, {} rounds".format(raptorDuration, raptor.rounds))
+    assert raptorArrivals == dijkstraArrivals
+
+    assert raptor.get_travel_times(schedule) == network.get_travel_times(schedule)
+    assert raptor.get_average_travel_time(schedule) == network.get_average_travel_time(
+        schedule
+    )
+    print("arrival and travel times match for all {} pairs".format(len(raptorArrivals)))
@@ -0,0 +1,202 @@
+import json
+import math
+import os
+import pickle
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+
+COLUMN_DTYPE = np.dtype("<f8")
+
+
+def flatten(record: dict[str, Any], prefix: str = "") -> dict[str, Any]:
+    # nested dicts like the network config become "network.amountCities" columns
+    flat: dict[str, Any] = dict()
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + "."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+class ResultStore:
+    # an append-only directory with one raw float64 file per numeric column and a
+    # json line per row for everything else. a row only counts once every file
+    # has it, so a run that was killed halfway through a row loses only that row
+    directory: str
+    columnNames: list[str]
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.columnNames = []
+        if os.path.exists(self.schema_path()):
+            with open(self.schema_path(), "r") as file:
+                self.columnNames = json.load(file)
+        self.truncate(len(self))
+
+    def schema_path(self) -> str:
+        return os.path.join(self.directory, "columns.json")
+
+    def column_path(self, name: str) -> str:
+        return os.path.join(self.directory, name + ".f64")
+
+    def metadata_path(self) -> str:
+        return os.path.join(self.directory, "metadata.jsonl")
+
+    def __len__(self) -> int:
+        lengths = [
+            os.path.getsize(self.column_path(name)) // COLUMN_DTYPE.itemsize
+            for name in self.columnNames
+        ]
+        if os.path.exists(self.metadata_path()):
+            with open(self.metadata_path(), "rb") as file:
+                lengths.append(sum(1 for line in file if line.endswith(b"\n")))
+        else:
+            lengths.append(0)
+        return min(lengths)
+
+    def truncate(self, rows: int):
+        # drops a row that was only partly written
+        for name in self.columnNames:
+            with open(self.column_path(name), "r+b") as file:
+                file.truncate(rows * COLUMN_DTYPE.itemsize)
+        if not os.path.exists(self.metadata_path()):
+            open(self.metadata_path(), "wb").close()
+            return
+        with open(self.metadata_path(), "rb") as file:
+            lines = file.readlines()
+        if len(lines) > rows:
+            with open(self.metadata_path(), "wb") as file:
+                file.writelines(lines[:rows])
+
+    def add_column(self, name: str, rows: int):
+        # rows from before the column existed get nan
+        with open(self.column_path(name), "wb") as file:
+            np.full(rows, np.nan, dtype=COLUMN_DTYPE).tofile(file)
+        self.columnNames.append(name)
+        with open(self.schema_path(), "w") as file:
+            json.dump(self.columnNames, file)
+
+    def append(self, record: dict[str, Any]):
+        self.append_many([record])
+
+    def append_many(self, records: Iterable[dict[str, Any]]):
+        rows = [flatten(record) for record in records]
+        if len(rows) == 0:
+            return
+        amount = len(self)
+        numeric: dict[str, list[float]] = dict()
+        metadata: list[dict[str, Any]] = []
+        for i, row in enumerate(rows):
+            other: dict[str, Any] = dict()
+            for key, value in row.items():
+                if isinstance(value, (bool, int, float)):
+                    if key not in numeric:
+                        numeric[key] = [math.nan] * len(rows)
+                    numeric[key][i] = float(value)
+                else:
+                    other[key] = value
+            metadata.append(other)
+        for name in numeric:
+            if name not in self.columnNames:
+                self.add_column(name, amount)
+        for name in self.columnNames:
+            values = numeric.get(name, [math.nan] * len(rows))
+            with open(self.column_path(name), "ab") as file:
+                np.array(values, dtype=COLUMN_DTYPE).tofile(file)
+                file.flush()
+                os.fsync(file.fileno())
+        # the metadata goes last, it is what makes the rows count
+        with open(self.metadata_path(), "a") as file:
+            file.writelines([json.dumps(other) + "\n" for other in metadata])
+            file.flush()
+            os.fsync(file.fileno())
+
+    def column(self, name: str) -> np.ndarray:
+        # a read-only memory map, nothing is loaded until it is used
+        rows = len(self)
+        if rows == 0:
+            return np.empty(0, dtype=COLUMN_DTYPE)
+        return np.memmap(
+            self.column_path(name), dtype=COLUMN_DTYPE, mode="r", shape=(rows,)
+        )
+
+    def metadata(self) -> Iterator[dict[str, Any]]:
+        with open(self.metadata_path(), "r") as file:
+            for _, line in zip(range(len(self)), file):
+                yield json.loads(line)
+
+    def __str__(self) -> str:
+        return "ResultStore {} with {} rows and columns {}".format(
+            self.directory, len(self), self.columnNames
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class RunningMoments:
+    # count, mean and sum of squared deviations, merged chunk by chunk so a
+    # column is read in a single pass without loading it completely
+    count: int
+    mean: float
+    squares: float
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.squares = 0.0
+
+    def update(self, chunk: np.ndarray):
+        chunk = chunk[~np.isnan(chunk)]
+        if len(chunk) == 0:
+            return
+        chunkMean = float(chunk.mean())
+        chunkSquares = float(((chunk - chunkMean) ** 2).sum())
+        total = self.count + len(chunk)
+        delta = chunkMean - self.mean
+        self.squares += chunkSquares + delta * delta * self.count * len(chunk) / total
+        self.mean += delta * len(chunk) / total
+        self.count = total
+
+    def variance(self) -> float:
+        return self.squares / (self.count - 1) if self.count > 1 else math.nan
+
+    def standard_error(self) -> float:
+        return math.sqrt(self.variance() / self.count) if self.count > 0 else math.nan
+
+    def __str__(self) -> str:
+        return "RunningMoments n={} mean={} variance={}".format(
+            self.count, self.mean, self.variance()
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def column_moments(column: np.ndarray, chunkSize: int = 1 << 20) -> RunningMoments:
+    moments = RunningMoments()
+    for start in range(0, len(column), chunkSize):
+        moments.update(np.asarray(column[start : start + chunkSize]))
+    return moments
+
+
+def load_legacy(filePath: str) -> tuple[list[float], list[float]]:
+    # the old whole-list pickles: (insertion results, evolutionary results)
+    with open(filePath, "rb") as file:
+        resultsInsertion, resultsEvolutionary = pickle.load(file)
+    return resultsInsertion, resultsEvolutionary
+
+
+def import_legacy(store: ResultStore, filePath: str):
+    resultsInsertion, resultsEvolutionary = load_legacy(filePath)
+    store.append_many(
+        [
+            {"trial": trial, "insertion": insertion, "evolutionary": evolutionary}
+            for trial, (insertion, evolutionary) in enumerate(
+                zip(resultsInsertion, resultsEvolutionary)
+            )
+        ]
+    )
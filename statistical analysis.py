@@ -1,25 +1,38 @@
-import pickle
+import os
 import numpy as np
 import scipy
 
+from resultStore import ResultStore, RunningMoments, column_moments, load_legacy
 
-def get_SE(data: np.ndarray):
-    return np.std(data, ddof=1) / np.sqrt(np.size(data))
+
+def get_SE(moments: RunningMoments):
+    return moments.standard_error()
+
+
+def load_moments(filePath: str) -> tuple[RunningMoments, RunningMoments]:
+    # a result store is read column by column through a memory map, the old
+    # pickles still have to be loaded completely
+    if os.path.isdir(filePath):
+        store = ResultStore(filePath)
+        return column_moments(store.column("insertion")), column_moments(
+            store.column("evolutionary")
+        )
+    resultsInsertion, resultsEvolutionary = load_legacy(filePath)
+    return column_moments(np.asarray(resultsInsertion, dtype=float)), column_moments(
+        np.asarray(resultsEvolutionary, dtype=float)
+    )
 
 
 def do_analysis(filePath: str) -> float:
-    with open(filePath, "rb") as file:
-        results = pickle.load(file)
-        resultsInsertion = results[0]
-        resultsEvolutionary = results[1]
-    SE_ins = get_SE(resultsInsertion)
-    SE_evo = get_SE(resultsEvolutionary)
+    momentsInsertion, momentsEvolutionary = load_moments(filePath)
+    SE_ins = get_SE(momentsInsertion)
+    SE_evo = get_SE(momentsEvolutionary)
     SE_combined = np.sqrt(SE_ins * SE_ins + SE_evo * SE_evo)
-    z = (np.mean(resultsInsertion) - np.mean(resultsEvolutionary)) / SE_combined
+    z = (momentsInsertion.mean - momentsEvolutionary.mean) / SE_combined
     p = scipy.stats.norm.sf(abs(z))
     print(
         (
-            np.mean(resultsInsertion) - np.mean(resultsEvolutionary),
+            momentsInsertion.mean - momentsEvolutionary.mean,
             1.96 * SE_combined,
             abs(z),
             p,
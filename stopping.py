@@ -0,0 +1,147 @@
+import os
+import pickle
+from typing import TYPE_CHECKING, Any
+import numpy as np
+
+from fitnessCache import ScheduleKey
+
+if TYPE_CHECKING:
+    from compositeTrack import CompositeTrack
+
+
+class StoppingCriteria:
+    # a run stops after patience generations without a better schedule, once the
+    # best fitness is at most targetFitness, or after timeBudget seconds.
+    # None switches a criterion off
+    patience: int | None
+    targetFitness: float | None
+    timeBudget: float | None
+    bestFitness: float | None
+    sinceImprovement: int
+
+    def __init__(
+        self,
+        patience: int | None = None,
+        targetFitness: float | None = None,
+        timeBudget: float | None = None,
+    ):
+        self.patience = patience
+        self.targetFitness = targetFitness
+        self.timeBudget = timeBudget
+        self.bestFitness = None
+        self.sinceImprovement = 0
+
+    def update(self, fitness: float | None):
+        # None is a generation without an exact best fitness, it does not count
+        if fitness is None:
+            return
+        if self.bestFitness is None or fitness < self.bestFitness:
+            self.bestFitness = fitness
+            self.sinceImprovement = 0
+        else:
+            self.sinceImprovement += 1
+
+    def reason(self, elapsed: float) -> str | None:
+        if self.patience is not None and self.sinceImprovement >= self.patience:
+            return "no improvement in {} generations".format(self.patience)
+        if (
+            self.targetFitness is not None
+            and self.bestFitness is not None
+            and self.bestFitness <= self.targetFitness
+        ):
+            return "reached target fitness {}".format(self.targetFitness)
+        if self.timeBudget is not None and elapsed >= self.timeBudget:
+            return "ran out of time after {:.1f}s".format(elapsed)
+        return None
+
+    def __str__(self) -> str:
+        return "StoppingCriteria patience {}, target {}, time budget {}".format(
+            self.patience, self.targetFitness, self.timeBudget
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class Checkpoint:
+    # the schedules are kept as city-id keys, so a checkpoint does not contain the
+    # network and can be turned back into tracks of the network it is resumed on.
+    # the signature of its tracks and the parameters of the run are kept to
+    # check that it is resumed on the same network and run
+    signature: np.ndarray
+    parameters: dict[str, Any]
+    generation: int
+    pool: list[ScheduleKey]
+    randomState: Any
+    rngState: dict[str, Any] | None
+    stopping: StoppingCriteria | None
+    elapsed: float
+
+    def __init__(
+        self,
+        signature: np.ndarray,
+        parameters: dict[str, Any],
+        generation: int,
+        pool: list[ScheduleKey],
+        randomState: Any,
+        rngState: dict[str, Any] | None,
+        stopping: StoppingCriteria | None,
+        elapsed: float,
+    ):
+        self.signature = signature
+        self.parameters = parameters
+        self.generation = generation
+        self.pool = pool
+        self.randomState = randomState
+        self.rngState = rngState
+        self.stopping = stopping
+        self.elapsed = elapsed
+
+    def __str__(self) -> str:
+        return "Checkpoint after {} generations with {} schedules".format(
+            self.generation, len(self.pool)
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def save_checkpoint(filePath: str, checkpoint: Checkpoint):
+    # written next to the old one and then swapped in, so an interrupted save
+    # leaves the previous checkpoint intact
+    temporaryPath = filePath + ".tmp"
+    with open(temporaryPath, "wb") as file:
+        pickle.dump(checkpoint, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporaryPath, filePath)
+
+
+def load_checkpoint(
+    filePath: str, signature: np.ndarray, parameters: dict[str, Any]
+) -> Checkpoint | None:
+    if not os.path.exists(filePath):
+        return None
+    with open(filePath, "rb") as file:
+        checkpoint: Checkpoint = pickle.load(file)
+    if not np.array_equal(checkpoint.signature, signature):
+        raise Exception("checkpoint {} belongs to a different network".format(filePath))
+    if checkpoint.parameters != parameters:
+        raise Exception(
+            "checkpoint {} belongs to a run with {} instead of {}".format(
+                filePath, checkpoint.parameters, parameters
+            )
+        )
+    return checkpoint
+
+
+def remove_checkpoint(filePath: str):
+    # a finished run leaves nothing to resume
+    if os.path.exists(filePath):
+        os.remove(filePath)
+
+
+def key_to_schedule(
+    tsp: dict[tuple[int, int], "CompositeTrack"], key: ScheduleKey
+) -> list[list["CompositeTrack"]]:
+    return [[tsp[start, end] for start, end in route] for route in key]
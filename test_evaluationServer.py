@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+
+import pytest
+
+from evaluationPool import EvaluationPool
+from evaluationServer import EvaluationServer, request_fitnesses, routes_to_schedule
+from network import TrainNetwork
+
+
+@pytest.fixture(scope="module")
+def network() -> TrainNetwork:
+    random.seed(4)
+    return TrainNetwork(40, 2, 2, 100)
+
+
+def random_schedules(amount: int, network: TrainNetwork) -> list[list[list[int]]]:
+    # city ids keep counting across networks, so they are taken from the network
+    cityIds = [city.id for city in network.cities]
+    return [
+        [random.sample(cityIds, random.randint(2, 6)) for _ in range(3)]
+        for _ in range(amount)
+    ]
+
+
+async def with_server(network: TrainNetwork, client, processes: int = 0):
+    # runs the client against a server on a fresh socket and stops the server after
+    with tempfile.TemporaryDirectory() as directory:
+        socketPath = os.path.join(directory, "evaluation.sock")
+        server = EvaluationServer(
+            network, socketPath, EvaluationPool(processes=processes), batchDelay=0.01
+        )
+        ready = asyncio.Event()
+        serving = asyncio.create_task(server.serve(ready))
+        await ready.wait()
+        try:
+            return await client(socketPath), server
+        finally:
+            serving.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await serving
+
+
+async def send_raw(socketPath: str, request: dict) -> dict:
+    reader, writer = await asyncio.open_unix_connection(socketPath)
+    writer.write((json.dumps(request) + "\n").encode())
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+    return response
+
+
+def test_concurrent_clients(network: TrainNetwork):
+    random.seed(1)
+    schedulesPerClient = [random_schedules(4, network) for _ in range(5)]
+
+    async def clients(socketPath: str):
+        return await asyncio.gather(
+            *[
+                request_fitnesses(socketPath, schedules)
+                for schedules in schedulesPerClient
+            ]
+        )
+
+    results, server = asyncio.run(with_server(network, clients))
+    for schedules, fitnesses in zip(schedulesPerClient, results):
+        assert fitnesses == [
+            network.get_average_travel_time(routes_to_schedule(network, routes))
+            for routes in schedules
+        ]
+    assert server.evaluated == 20
+    # requests of the clients that arrive together share a batch
+    assert server.batches < 20
+
+
+def test_process_pool(network: TrainNetwork):
+    random.seed(2)
+    schedules = random_schedules(10, network)
+
+    async def client(socketPath: str):
+        return await request_fitnesses(socketPath, schedules)
+
+    fitnesses, server = asyncio.run(with_server(network, client, processes=2))
+    assert fitnesses == [
+        network.get_average_travel_time(routes_to_schedule(network, routes))
+        for routes in schedules
+    ]
+    assert server.evaluated == 10
+    assert server.batches == 1
+
+
+def test_malformed_route(network: TrainNetwork):
+    routes = [[city.id for city in network.cities[:3]]]
+
+    async def client(socketPath: str):
+        bad = await send_raw(socketPath, {"id": "bad", "schedule": [[0], [1, 2]]})
+        broken = await send_raw(socketPath, {"schedule": 3})
+        good = await request_fitnesses(socketPath, [routes])
+        return bad, broken, good
+
+    (bad, broken, good), _ = asyncio.run(with_server(network, client))
+    assert bad["id"] == "bad"
+    assert "at least two cities" in bad["error"]
+    assert "error" in broken
+    # the server keeps answering after a failed request
+    assert good == [
+        network.get_average_travel_time(routes_to_schedule(network, routes))
+    ]